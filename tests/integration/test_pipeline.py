@@ -0,0 +1,296 @@
+###############################################################################
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+###############################################################################
+
+
+# tests of the wis2box-management data pipeline components, these do not
+# need the deployment in .github/workflows/tests-docker.yml
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ.setdefault('WIS2BOX_DATADIR', tempfile.gettempdir())
+
+from wis2box.api import BulkIndexer  # noqa: E402
+from wis2box.api.backend.base import BulkUpsertError  # noqa: E402
+from wis2box.data_mappings import (DataMappings, DatasetIndex,  # noqa: E402
+                                   match_dataset)
+from wis2box.pubsub.ingest import EventCache, IngestQueue  # noqa: E402
+from wis2box.pubsub.subscribe import WIS2BoxSubscriber  # noqa: E402
+from wis2box.util import SubstringIndex  # noqa: E402
+
+
+SYNOP = 'urn:wmo:md:xx-test:synop'
+SYNOP_EXTRA = 'urn:wmo:md:xx-test:synop-extra'
+TOPIC = 'origin/a/wis2/xx-test/data/core/weather/surface-based-observations'
+DATA_MAPPINGS = {
+    SYNOP: {
+        'topic_hierarchy': f'{TOPIC}/synop',
+        'plugins': {}
+    },
+    SYNOP_EXTRA: {
+        'topic_hierarchy': f'{TOPIC}/synop-extra',
+        'plugins': {}
+    }
+}
+
+
+def test_substring_index():
+    """Test that all patterns contained in a text are found"""
+
+    index = SubstringIndex(['he', 'she', 'his', 'hers', ''])
+
+    assert index.patterns == ['he', 'she', 'his', 'hers']
+    assert index.search('ushers') == {'he', 'she', 'hers'}
+    assert index.search('this') == {'his'}
+    assert index.search('tool') == set()
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_match_dataset_longest_match(reverse):
+    """Test that the longest match wins, whatever the data mappings order"""
+
+    data_mappings = dict(sorted(DATA_MAPPINGS.items(), reverse=reverse))
+    topic = TOPIC.replace('origin/a/wis2/', '')
+
+    paths = {
+        f'wis2box-incoming/{SYNOP}/data.csv': SYNOP,
+        f'wis2box-incoming/{SYNOP_EXTRA}/data.csv': SYNOP_EXTRA,
+        f'wis2box-incoming/{SYNOP.replace(":", ".")}/data.csv': SYNOP,
+        f'wis2box-incoming/{SYNOP_EXTRA.replace(":", ".")}/data.csv': SYNOP_EXTRA, # noqa
+        # topic only
+        f'wis2box-incoming/{topic}/synop/data.csv': SYNOP,
+        f'wis2box-incoming/{topic}/synop-extra/data.csv': SYNOP_EXTRA
+    }
+
+    for path, metadata_id in paths.items():
+        topic_hierarchy = DATA_MAPPINGS[metadata_id]['topic_hierarchy']
+        assert match_dataset(path, data_mappings) == (metadata_id, topic_hierarchy) # noqa
+        assert match_dataset(path, DataMappings(data_mappings)) == (metadata_id, topic_hierarchy) # noqa
+
+
+def test_match_dataset_identifier_over_topic():
+    """Test that metadata identifiers take precedence over topics"""
+
+    topic = TOPIC.replace('origin/a/wis2/', '')
+    path = f'wis2box-incoming/{SYNOP}/{topic}/synop-extra/data.csv'
+
+    assert DatasetIndex(DATA_MAPPINGS).match(path)[0] == SYNOP
+
+
+def test_match_dataset_no_match():
+    """Test that unmatched paths are rejected"""
+
+    with pytest.raises(ValueError):
+        match_dataset('wis2box-incoming/xx-other/data.csv', DATA_MAPPINGS)
+
+
+def test_data_mappings_patch():
+    """Test that patches increment the version of a copy"""
+
+    data_mappings = DataMappings({SYNOP: DATA_MAPPINGS[SYNOP]}, version=3)
+
+    patched = data_mappings.patch(SYNOP_EXTRA, DATA_MAPPINGS[SYNOP_EXTRA])
+    assert patched.version == 4
+    assert patched.token == data_mappings.token
+    assert sorted(patched) == [SYNOP, SYNOP_EXTRA]
+    assert list(data_mappings) == [SYNOP]
+
+    # routing index follows the version
+    path = f'wis2box-incoming/{SYNOP_EXTRA}/data.csv'
+    assert data_mappings.index.match(path)[0] == SYNOP
+    assert patched.index.match(path)[0] == SYNOP_EXTRA
+
+    removed = patched.patch(SYNOP_EXTRA)
+    assert removed.version == 5
+    assert list(removed) == [SYNOP]
+
+
+def test_data_mappings_refresh(monkeypatch):
+    """Test that subscribers apply the next version, and reload otherwise"""
+
+    module = sys.modules['wis2box.pubsub.subscribe']
+    reloads = []
+
+    def get_data_mappings():
+        reloads.append(True)
+        return DataMappings(DATA_MAPPINGS)
+
+    monkeypatch.setattr(module, 'get_data_mappings', get_data_mappings)
+    monkeypatch.setattr(module, 'preload_plugins', lambda value: None)
+
+    subscriber = WIS2BoxSubscriber.__new__(WIS2BoxSubscriber)
+    subscriber.data_mappings = DataMappings({SYNOP: DATA_MAPPINGS[SYNOP]},
+                                            version=1)
+
+    # next version is applied
+    subscriber.refresh_data_mappings({
+        'metadata_id': SYNOP_EXTRA,
+        'data_mappings': DATA_MAPPINGS[SYNOP_EXTRA],
+        'version': 2
+    })
+    assert subscriber.data_mappings.version == 2
+    assert sorted(subscriber.data_mappings) == [SYNOP, SYNOP_EXTRA]
+    assert not reloads
+
+    # missed version triggers a reload
+    subscriber.refresh_data_mappings({
+        'metadata_id': SYNOP_EXTRA,
+        'data_mappings': None,
+        'version': 4
+    })
+    assert subscriber.data_mappings.version == 4
+    assert sorted(subscriber.data_mappings) == [SYNOP, SYNOP_EXTRA]
+    assert len(reloads) == 1
+
+    # full reload request
+    subscriber.refresh_data_mappings({})
+    assert subscriber.data_mappings.version == 5
+    assert len(reloads) == 2
+
+
+def test_ingest_queue_lanes():
+    """Test that lanes are served by weighted round robin"""
+
+    queue = IngestQueue(maxsize=100)
+    for priority in ['low', 'normal', 'high']:
+        for i in range(13):
+            assert queue.put({'priority': priority, 'i': i},
+                             priority=priority)
+
+    events = [queue.get() for i in range(13)]
+    assert events[0] == {'priority': 'high', 'i': 0}
+
+    counts = {}
+    for event in events:
+        priority = event['priority']
+        # events are served in order within a lane
+        assert event['i'] == counts.get(priority, 0)
+        counts[priority] = counts.get(priority, 0) + 1
+    assert counts == {'high': 8, 'normal': 4, 'low': 1}
+
+    # remaining events are served once other lanes are empty
+    events = [queue.get() for i in range(26)]
+    assert [e['i'] for e in events if e['priority'] == 'low'] == list(range(1, 13)) # noqa
+    assert queue.qsize() == 0
+
+
+def test_ingest_queue_bound():
+    """Test that each lane is bounded separately"""
+
+    queue = IngestQueue(maxsize=2)
+    assert queue.put({}, priority='low')
+    assert queue.put({}, priority='low')
+    assert not queue.put({}, timeout=0, priority='low')
+    assert queue.put({}, timeout=0, priority='high')
+    assert queue.put({}, timeout=0, priority='unknown')
+    assert queue.qsize() == 4
+
+
+def test_event_cache(monkeypatch):
+    """Test that events are remembered within their TTL, oldest first"""
+
+    now = [0]
+    monkeypatch.setattr(sys.modules['wis2box.pubsub.ingest'], 'monotonic',
+                        lambda: now[0])
+
+    cache = EventCache(maxsize=2, ttl=60)
+    assert not cache.seen(('bucket', 'a', 'etag'))
+    assert cache.seen(('bucket', 'a', 'etag'))
+    assert not cache.seen(('bucket', 'a', 'etag2'))
+    assert cache.suppressed == 1
+
+    # oldest event is forgotten once the cache is full
+    assert not cache.seen(('bucket', 'b', 'etag'))
+    assert not cache.seen(('bucket', 'a', 'etag'))
+
+    # events are forgotten once expired
+    now[0] = 59
+    assert cache.seen(('bucket', 'b', 'etag'))
+    now[0] = 60
+    assert not cache.seen(('bucket', 'b', 'etag'))
+    assert cache.suppressed == 2
+
+
+class FakeBackend:
+    """Backend rejecting some items of bulk upserts"""
+
+    def __init__(self, rejected: dict) -> None:
+        self.rejected = rejected
+        self.upserts = []
+
+    def upsert_collection_items(self, collection_id, items):
+        self.upserts.append([item['id'] for item in items])
+        ids = [item['id'] for item in items
+               if self.rejected.get(item['id'], 0) > 0]
+        for id_ in ids:
+            self.rejected[id_] -= 1
+        if ids:
+            raise BulkUpsertError(f'{len(ids)} items rejected', ids)
+
+
+@pytest.fixture
+def indexer():
+    indexer = BulkIndexer('messages', size=1000, interval=3600)
+    yield indexer
+    indexer.stop()
+
+
+def test_bulk_indexer_retry(monkeypatch, indexer):
+    """Test that rejected items are retried once, then dropped"""
+
+    backend = FakeBackend({'b': 1, 'c': 2})
+    monkeypatch.setattr(sys.modules['wis2box.api'], 'load_backend',
+                        lambda: backend)
+
+    for id_ in ['a', 'b', 'c']:
+        indexer.add({'id': id_})
+    indexer.flush()
+    indexer.add({'id': 'd'})
+    indexer.flush()
+    indexer.flush()
+
+    # b succeeds on retry, c is dropped after failing twice
+    assert backend.upserts == [['a', 'b', 'c'], ['b', 'c', 'd']]
+
+
+def test_bulk_indexer_failure(monkeypatch, indexer):
+    """Test that all items are retried when the upsert fails"""
+
+    calls = []
+
+    class Backend:
+        def upsert_collection_items(self, collection_id, items):
+            calls.append([item['id'] for item in items])
+            if len(calls) == 1:
+                raise RuntimeError('connection refused')
+
+    monkeypatch.setattr(sys.modules['wis2box.api'], 'load_backend',
+                        lambda: Backend())
+
+    indexer.add({'id': 'a'})
+    indexer.add({'id': 'b'})
+    indexer.flush()
+    indexer.flush()
+
+    assert calls == [['a', 'b'], ['a', 'b']]
@@ -20,43 +20,156 @@
 ###############################################################################
 
 import click
+from collections import deque
+import json
 import logging
+import os
 import requests
+from requests.adapters import HTTPAdapter
+import threading
 
-from time import sleep
+from time import monotonic, sleep
+from typing import Tuple
 
 from owslib.ogcapi.records import Records
+from urllib3.util.retry import Retry
 
 from wis2box import cli_helpers
 from wis2box.api.backend import load_backend
+from wis2box.api.backend.base import BulkUpsertError
+from wis2box.api.cache import ResultCache
 from wis2box.api.config import load_config
 from wis2box.data_mappings import get_plugins
 
 from wis2box.env import (DOCKER_API_URL, API_URL, STORAGE_API_RETENTION_DAYS,
-                         STORAGE_DATA_RETENTION_DAYS)
+                         STORAGE_DATA_RETENTION_DAYS, API_POOL_SIZE,
+                         API_TIMEOUT, API_RETRIES, API_SYNC_MAX_SIZE,
+                         API_MAX_JOBS, API_CACHE_DIR, API_CACHE_SIZE)
+from wis2box.util import fork_safe_lock
 
 LOGGER = logging.getLogger(__name__)
 
+# HTTP sessions are reused within a process, and shared by its threads
+_SESSIONS = {}
+_SESSIONS_LOCK = fork_safe_lock()
 
-def execute_api_process(process_name: str, payload: dict) -> dict:
+# cache of process results, if enabled
+_RESULT_CACHE = None
+
+
+def get_session() -> requests.Session:
     """
-    Executes a process on the API
+    Get HTTP session to wis2box-api, keeping connections alive within a
+    process
+
+    :returns: `requests.Session` object
+    """
+
+    pid = os.getpid()
+    with _SESSIONS_LOCK:
+        if pid not in _SESSIONS:
+            # gateway errors are retried with exponential backoff
+            retry = Retry(total=API_RETRIES, backoff_factor=0.5,
+                          status_forcelist=[502, 503, 504],
+                          allowed_methods=['GET'],
+                          raise_on_status=False)
+            # process executions are not idempotent, so they are only retried
+            # when the gateway did not pass them on, never after a timeout
+            retry_execution = Retry(total=API_RETRIES, backoff_factor=0.5,
+                                    read=0, status_forcelist=[502, 503],
+                                    allowed_methods=['POST'],
+                                    raise_on_status=False)
+            # connections to wis2box-api and to storage (data URLs)
+            adapter = HTTPAdapter(pool_connections=4,
+                                  pool_maxsize=API_POOL_SIZE,
+                                  max_retries=retry)
+            adapter_execution = HTTPAdapter(pool_connections=1,
+                                            pool_maxsize=API_POOL_SIZE,
+                                            max_retries=retry_execution)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.mount(f'{DOCKER_API_URL}/processes/', adapter_execution)
+            _SESSIONS[pid] = session
+
+    return _SESSIONS[pid]
+
+
+def get_result_cache() -> ResultCache:
+    """
+    Get cache of process results
+
+    :returns: `ResultCache` object, or `None` if caching is disabled
+    """
+
+    global _RESULT_CACHE
+
+    with _SESSIONS_LOCK:
+        if API_CACHE_DIR and _RESULT_CACHE is None:
+            _RESULT_CACHE = ResultCache(API_CACHE_DIR,
+                                        API_CACHE_SIZE * 1024 * 1024)
+
+    return _RESULT_CACHE
+
+
+def invalidate_result_cache() -> None:
+    """
+    Invalidate cached process results, e.g. after station metadata
+    changed
+
+    :returns: `None`
+    """
+
+    cache = get_result_cache()
+    if cache is not None:
+        cache.invalidate()
+
+
+def is_cacheable(result: dict) -> bool:
+    """
+    Check whether a process result can be reused for the same inputs
+
+    :param result: `dict` with execution-result
+
+    :returns: `bool` of whether the result is cacheable
+    """
+
+    # warnings (e.g. unknown stations) may not apply to a later run
+    return (isinstance(result, dict) and
+            not result.get('errors') and not result.get('error') and
+            not result.get('warnings'))
+
+
+def post_api_process(process_name: str, payload: dict,
+                     asynchronous: bool = None) -> Tuple[dict, str]:
+    """
+    Posts an execution request of a process to the API
 
     :param process_name: process name
     :param payload: payload to send to process
+    :param asynchronous: `bool` of whether to execute the process as a job,
+                         by default only for large payloads
 
-    :returns: `dict` with execution-result
+    :returns: tuple of execution-result (or `None` if executed as a job)
+              and job location (or `None` if executed synchronously)
     """
 
     LOGGER.debug('Posting data to wis2box-api')
+    body = json.dumps(payload)
     headers = {
         'accept': 'application/json',
-        'Content-Type': 'application/json',
-        'prefer': 'respond-async'
+        'Content-Type': 'application/json'
     }
+    # small payloads are executed synchronously, saving the status polling
+    if asynchronous is None:
+        asynchronous = len(body) > API_SYNC_MAX_SIZE * 1024
+    if asynchronous:
+        headers['prefer'] = 'respond-async'
     url = f'{DOCKER_API_URL}/processes/{process_name}/execution'
 
-    response = requests.post(url, headers=headers, json=payload)
+    session = get_session()
+    response = session.post(url, headers=headers, data=body,
+                            timeout=API_TIMEOUT)
     if response.status_code >= 400:
         msg = f'Failed to post data to wis2box-api: {response.status_code}' # noqa
         if response.text:
@@ -65,29 +178,153 @@ def execute_api_process(process_name: str, payload: dict) -> dict:
         raise ValueError(msg)
 
     if response.status_code == 200:
-        return response.json()
+        return response.json(), None
 
     headers_json = dict(response.headers)
     location = headers_json['Location']
     location = location.replace(API_URL, DOCKER_API_URL)
 
-    status = 'accepted'
-    while status in ['accepted', 'running']:
-        # get the job status
-        headers = {
-            'accept': 'application/json',
-            'Content-Type': 'application/json'
-        }
-        response = requests.get(location, headers=headers)
-        response_json = response.json()
-        if 'status' in response_json:
-            status = response_json['status']
-        sleep(0.05)
+    return None, location
+
+
+def get_api_process_result(location: str) -> dict:
+    """
+    Gets the result of a process job on the API, if the job is done
+
+    :param location: job location
+
+    :returns: `dict` with execution-result, or `None` if the job is
+              still accepted or running
+    """
+
+    headers = {
+        'accept': 'application/json',
+        'Content-Type': 'application/json'
+    }
+    session = get_session()
+    # get the job status
+    response = session.get(location, headers=headers, timeout=API_TIMEOUT)
+    response_json = response.json()
+    if response_json.get('status') in ['accepted', 'running']:
+        return None
+
     # get result from location/results?f=json
-    response = requests.get(f'{location}/results?f=json', headers=headers) # noqa
+    response = session.get(f'{location}/results?f=json', headers=headers,
+                           timeout=API_TIMEOUT)
     return response.json()
 
 
+def get_api_data(url: str) -> bytes:
+    """
+    Fetches data referenced by URL in a process result
+
+    :param url: `str` of data URL
+
+    :returns: `bytes` of data
+    """
+
+    LOGGER.debug(f'Fetching data from {url}')
+    response = get_session().get(url, timeout=API_TIMEOUT)
+    response.raise_for_status()
+
+    return response.content
+
+
+def execute_api_process(process_name: str, payload: dict) -> dict:
+    """
+    Executes a process on the API
+
+    :param process_name: process name
+    :param payload: payload to send to process
+
+    :returns: `dict` with execution-result
+    """
+
+    # identical inputs give identical results
+    cache = get_result_cache()
+    if cache is not None:
+        key = cache.get_key(process_name, payload)
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+    result, location = post_api_process(process_name, payload)
+
+    # poll quickly for short jobs, backing off exponentially for long jobs
+    interval = 0.05
+    while location is not None:
+        result = get_api_process_result(location)
+        if result is not None:
+            break
+        sleep(interval)
+        interval = min(interval * 2, 2)
+
+    if cache is not None and is_cacheable(result):
+        cache.put(key, result)
+
+    return result
+
+
+def execute_api_processes(process_name: str, payloads: list) -> list:
+    """
+    Executes a process on the API for several inputs, keeping up to
+    API_MAX_JOBS jobs running while collecting their results
+
+    :param process_name: process name
+    :param payloads: `list` of payloads to send to process
+
+    :returns: `list` with execution-result `dict` of each payload, or the
+              exception raised for it
+    """
+
+    if len(payloads) == 1:
+        try:
+            return [execute_api_process(process_name, payloads[0])]
+        except Exception as err:
+            return [err]
+
+    results = [None] * len(payloads)
+    todo = deque(enumerate(payloads))
+    locations = {}
+    keys = {}
+    cache = get_result_cache()
+    interval = 0.05
+    while todo or locations:
+        while todo and len(locations) < API_MAX_JOBS:
+            i, payload = todo.popleft()
+            if cache is not None:
+                keys[i] = cache.get_key(process_name, payload)
+                results[i] = cache.get(keys[i])
+                if results[i] is not None:
+                    continue
+            try:
+                # small payloads are still executed synchronously
+                results[i], location = post_api_process(process_name,
+                                                        payload)
+                if location is not None:
+                    locations[i] = location
+                    interval = 0.05
+                elif cache is not None and is_cacheable(results[i]):
+                    cache.put(keys[i], results[i])
+            except Exception as err:
+                results[i] = err
+
+        for i, location in list(locations.items()):
+            try:
+                results[i] = get_api_process_result(location)
+            except Exception as err:
+                results[i] = err
+            if results[i] is not None:
+                locations.pop(i)
+                if cache is not None and is_cacheable(results[i]):
+                    cache.put(keys[i], results[i])
+        if locations:
+            sleep(interval)
+            interval = min(interval * 2, 2)
+
+    return results
+
+
 def setup_collection(meta: dict = {}) -> bool:
     """
     Add collection to api backend and configuration
@@ -188,6 +425,125 @@ def upsert_collection_item(collection_id: str, item: dict) -> str:
     return True
 
 
+class BulkIndexer:
+    """
+    Buffer of collection items, upserted in bulk once the buffer is full
+    or after an interval
+
+    Items that fail to be upserted are retried once with the next flush,
+    and logged by identifier if they fail again.
+    """
+
+    def __init__(self, collection_id: str, size: int = 500,
+                 interval: float = 1) -> None:
+        """
+        Bulk indexer initializer
+
+        :param collection_id: name of collection
+        :param size: `int` of maximum number of buffered items
+        :param interval: `float` of maximum seconds an item is buffered
+
+        :returns: `None`
+        """
+
+        self.collection_id = collection_id
+        self.size = size
+        self.interval = interval
+        self._items = []
+        # items that failed once, by object id
+        self._retried = set()
+        self._running = True
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, item: dict) -> None:
+        """
+        Add an item to the buffer
+
+        :param item: `dict` of GeoJSON item data
+
+        :returns: `None`
+        """
+
+        with self._cond:
+            self._items.append(item)
+            if len(self._items) >= self.size:
+                self._cond.notify()
+
+    def flush(self) -> None:
+        """
+        Upsert buffered items
+
+        :returns: `None`
+        """
+
+        with self._flush_lock:
+            with self._cond:
+                items, self._items = self._items, []
+            if not items:
+                return
+
+            LOGGER.debug(f'Upserting {len(items)} items into {self.collection_id}') # noqa
+            retried, self._retried = self._retried, set()
+            try:
+                backend = load_backend()
+                backend.upsert_collection_items(self.collection_id, items)
+                return
+            except BulkUpsertError as err:
+                ids = set(err.ids)
+                failed = [item for item in items if item.get('id') in ids]
+                LOGGER.error(f'Failed to upsert {len(failed)} of {len(items)} items into {self.collection_id}: {err}') # noqa
+            except Exception as err:
+                failed = items
+                LOGGER.error(f'Failed to upsert {len(items)} items into {self.collection_id}: {err}') # noqa
+
+            retry = [item for item in failed if id(item) not in retried]
+            dropped = [item.get('id') for item in failed
+                       if id(item) in retried]
+            if dropped:
+                LOGGER.error(f'Dropped {len(dropped)} items of {self.collection_id}: {dropped}') # noqa
+            if retry:
+                LOGGER.warning(f'Retrying {len(retry)} items of {self.collection_id}: {[item.get("id") for item in retry]}') # noqa
+                self._retried = {id(item) for item in retry}
+                with self._cond:
+                    self._items[:0] = retry
+
+    def _run(self) -> None:
+        """
+        Flush the buffer when full or once the interval has elapsed
+
+        :returns: `None`
+        """
+
+        while self._running:
+            deadline = monotonic() + self.interval
+            with self._cond:
+                while (self._running and len(self._items) < self.size and
+                       monotonic() < deadline):
+                    self._cond.wait(deadline - monotonic())
+            self.flush()
+
+    def stop(self) -> None:
+        """
+        Flush remaining items and stop flushing
+
+        :returns: `None`
+        """
+
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        # items that just failed are retried once
+        self.flush()
+
+    def __repr__(self):
+        return f'<BulkIndexer ({self.collection_id})>'
+
+
 def reindex_collection(collection_id: str, new_collection_id: str) -> str:
     """
     Reindex a collection
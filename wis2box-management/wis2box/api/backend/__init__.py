@@ -20,13 +20,19 @@
 ###############################################################################
 
 import logging
+import os
 from typing import Any
 
 from wis2box.env import API_BACKEND_TYPE, API_BACKEND_URL
 from wis2box.plugin import load_plugin, PLUGINS
+from wis2box.util import fork_safe_lock
 
 LOGGER = logging.getLogger(__name__)
 
+# backend clients are reused within a process
+_BACKENDS = {}
+_BACKENDS_LOCK = fork_safe_lock()
+
 
 def load_backend() -> Any:
     """
@@ -37,10 +43,14 @@ def load_backend() -> Any:
 
     LOGGER.debug('Loading backend')
 
-    codepath = PLUGINS['api_backend'][API_BACKEND_TYPE]['plugin']
-    defs = {
-        'codepath': codepath,
-        'url': API_BACKEND_URL
-    }
-
-    return load_plugin('api_backend', defs)
+    pid = os.getpid()
+    with _BACKENDS_LOCK:
+        if pid not in _BACKENDS:
+            codepath = PLUGINS['api_backend'][API_BACKEND_TYPE]['plugin']
+            defs = {
+                'codepath': codepath,
+                'url': API_BACKEND_URL
+            }
+            _BACKENDS[pid] = load_plugin('api_backend', defs)
+
+    return _BACKENDS[pid]
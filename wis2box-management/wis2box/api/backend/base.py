@@ -142,3 +142,19 @@ class BaseBackend:
 
     def __repr__(self):
         return f'<BaseBackend> (url={self.url})'
+
+
+class BulkUpsertError(RuntimeError):
+    """Some items of a bulk upsert were rejected"""
+    def __init__(self, msg: str, ids: list) -> None:
+        """
+        Bulk upsert error initializer
+
+        :param msg: `str` of error message
+        :param ids: `list` of identifiers of rejected items
+
+        :returns: `None`
+        """
+
+        super().__init__(msg)
+        self.ids = ids
@@ -24,7 +24,7 @@ import logging
 from elasticsearch import Elasticsearch, helpers
 from typing import Tuple
 
-from wis2box.api.backend.base import BaseBackend
+from wis2box.api.backend.base import BaseBackend, BulkUpsertError
 from wis2box.util import datetime_days_ago
 
 logging.getLogger('elasticsearch').setLevel(logging.ERROR)
@@ -372,11 +372,19 @@ class ElasticBackend(BaseBackend):
                     '_id': feature['id'],
                     '_source': feature
                 }
-        success, errors = helpers.bulk(self.conn, gendata(items), raise_on_error=False) # noqa
+        # documents rejected with 429 (too many requests) are retried with
+        # exponential backoff
+        success, errors = helpers.bulk(self.conn, gendata(items),
+                                       raise_on_error=False,
+                                       max_retries=5, initial_backoff=1)
         if errors:
+            ids = []
             for error in errors:
                 LOGGER.error(f"Indexing error: {error}")
-            raise RuntimeError(f"Upsert failed with {len(errors)} errors")
+                # errors are keyed by operation, e.g. {'index': {...}}
+                ids.extend(op.get('_id') for op in error.values())
+            msg = f"Upsert failed with {len(errors)} errors"
+            raise BulkUpsertError(msg, ids)
 
     def delete_collection_item(self, collection_id: str, item_id: str) -> str:
         """
@@ -0,0 +1,204 @@
+###############################################################################
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+###############################################################################
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import tempfile
+from typing import Union
+import uuid
+
+from wis2box.util import fork_safe_lock
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Disk cache of process results, keyed by a digest of the process and
+    its inputs
+
+    Least recently used results are evicted once the cache exceeds its
+    size.  Entries are written atomically, so that the cache can be shared
+    between processes and threads.  Invalidating the cache starts a new
+    generation of keys, leaving previous entries to be evicted.
+    """
+
+    def __init__(self, path: str, max_size: int) -> None:
+        """
+        Result cache initializer
+
+        :param path: `str` of cache directory
+        :param max_size: `int` of maximum cache size in bytes
+
+        :returns: `None`
+        """
+
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self._generation_file = self.path / 'generation'
+        # bytes written since the cache size was last checked
+        self._written = 0
+        self._lock = fork_safe_lock()
+
+    def get_generation(self) -> str:
+        """
+        Get current generation of cache keys
+
+        :returns: `str` of generation
+        """
+
+        try:
+            return self._generation_file.read_text()
+        except FileNotFoundError:
+            return ''
+
+    def invalidate(self) -> None:
+        """
+        Invalidate all cached results
+
+        :returns: `None`
+        """
+
+        LOGGER.debug('Invalidating cached results')
+        with tempfile.NamedTemporaryFile('w', dir=self.path,
+                                         delete=False) as fh:
+            fh.write(uuid.uuid4().hex)
+        os.replace(fh.name, self._generation_file)
+
+    def get_key(self, process_name: str,
+                payload: dict) -> Union[str, None]:
+        """
+        Get cache key of a process execution, from the process, its
+        parameters and the digest of its input data
+
+        Data passed by URL is identified by the digest of the referenced
+        data (see `wis2box.storage.DataURL`), as the URL itself may change
+        between requests (e.g. presigned URLs).
+
+        :param process_name: process name
+        :param payload: payload sent to process
+
+        :returns: `str` of cache key, or `None` if the input data cannot
+                  be identified
+        """
+
+        inputs = dict(payload.get('inputs', {}))
+        data = inputs.pop('data', None)
+        data_url = inputs.pop('data_url', None)
+        if data is not None:
+            digest = hashlib.sha256(str(data).encode()).hexdigest()
+        elif data_url is not None:
+            digest = getattr(data_url, 'digest', None)
+            if digest is None:
+                return None
+        else:
+            digest = None
+
+        content = json.dumps([self.get_generation(), process_name, inputs,
+                              digest], sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def _get_filepath(self, key: str) -> Path:
+        return self.path / key[:2] / f'{key}.json'
+
+    def get(self, key: str) -> dict:
+        """
+        Get cached result
+
+        :param key: `str` of cache key
+
+        :returns: `dict` of result, or `None` if not cached
+        """
+
+        if key is None:
+            return None
+
+        filepath = self._get_filepath(key)
+        try:
+            with filepath.open() as fh:
+                result = json.load(fh)
+            # mark as recently used
+            os.utime(filepath)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        LOGGER.debug(f'Using cached result {key}')
+        return result
+
+    def put(self, key: str, result: dict) -> None:
+        """
+        Cache a result
+
+        :param key: `str` of cache key
+        :param result: `dict` of result
+
+        :returns: `None`
+        """
+
+        if key is None:
+            return
+
+        filepath = self._get_filepath(key)
+        filepath.parent.mkdir(exist_ok=True)
+        content = json.dumps(result)
+        with tempfile.NamedTemporaryFile('w', dir=filepath.parent,
+                                         delete=False) as fh:
+            fh.write(content)
+        os.replace(fh.name, filepath)
+
+        with self._lock:
+            self._written += len(content)
+            full = self._written > self.max_size / 10
+            if full:
+                self._written = 0
+        if full:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove least recently used results until the cache fits its size
+
+        :returns: `None`
+        """
+
+        entries = []
+        size = 0
+        for filepath in self.path.glob('*/*.json'):
+            try:
+                stat = filepath.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filepath))
+            size += stat.st_size
+
+        for _, filesize, filepath in sorted(entries):
+            if size <= self.max_size:
+                break
+            LOGGER.debug(f'Evicting cached result {filepath.stem}')
+            filepath.unlink(missing_ok=True)
+            size -= filesize
+
+    def __repr__(self):
+        return f'<ResultCache ({self.path})>'
@@ -19,27 +19,37 @@
 #
 ###############################################################################
 import base64
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
 import logging
 from pathlib import Path
 import re
 from typing import Iterator, Union
 
-from wis2box.env import (STORAGE_PUBLIC,
+from wis2box.api import execute_api_processes, get_api_data
+from wis2box.env import (HANDLER_PUBLISH_CONCURRENCY, STORAGE_PUBLIC,
                          STORAGE_SOURCE, BROKER_PUBLIC,
                          DOCKER_BROKER)
-from wis2box.storage import exists, get_data, put_data
-
-from wis2box.plugin import load_plugin, PLUGINS
+from wis2box.storage import get_data, get_metadata, put_data
 
+from wis2box.publisher import load_publisher
 from wis2box.pubsub.message import WISNotificationMessage
 
 LOGGER = logging.getLogger(__name__)
 
+# object metadata holding the digest of published data
+DIGEST_METADATA_KEY = 'sha512'
+
 
 class BaseAbstractData:
     """Abstract data"""
 
+    # wis2box-api process converting input data, if any
+    process_name = None
+    # whether the process accepts input data by URL
+    data_url_input = False
+
     def __init__(self, defs: dict) -> None:
         """
         Abstract data initializer
@@ -55,10 +65,13 @@ class BaseAbstractData:
         self.metadata_id = defs.get('metadata_id')
         self.topic_hierarchy = defs.get('topic_hierarchy')
         self.template = defs.get('template')
-        self.file_filter = defs.get('pattern', '.*')
+        self.file_filter = re.compile(defs.get('pattern', '.*'))
         self.enable_notification = defs.get('notify', False)
         self.buckets = defs.get('buckets', ())
         self.output_data = {}
+        self.batch_output_data = []
+        # notifications of the items being published, if collected
+        self._notifications = None
         self.discovery_metadata = {}
         self.gts = None
         gts_ttaaii = defs.get('gts_ttaaii')
@@ -80,13 +93,7 @@ class BaseAbstractData:
         }
         if wsi is not None:
             message['wigos_station_identifier'] = wsi
-        # load plugin for local broker
-        defs = {
-            'codepath': PLUGINS['pubsub']['mqtt']['plugin'],
-            'url': DOCKER_BROKER, # noqa
-            'client_type': 'failure-publisher'
-        }
-        local_broker = load_plugin('pubsub', defs)
+        local_broker = load_publisher(DOCKER_BROKER)
         # publish with qos=0
         success = local_broker.pub('wis2box/failure', json.dumps(message), qos=0) # noqa
         if not success:
@@ -133,19 +140,75 @@ class BaseAbstractData:
 
         raise NotImplementedError()
 
+    def transform_batch(self, inputs: list) -> list:
+        """
+        Transform several inputs
+
+        Plugins converting data with a wis2box-api process keep several
+        inputs in flight at once (see `execute_api_processes`).  The
+        output data of each input is kept apart in `batch_output_data`,
+        so that items of different files with the same identifier do not
+        overwrite each other.
+
+        :param inputs: `list` of tuples of input data and filename
+
+        :returns: `list` of processing result of each input, or the
+                  exception raised for it
+        """
+
+        results = [None] * len(inputs)
+        self.batch_output_data = [{} for _ in inputs]
+
+        def collect(i, func, *args, **kwargs):
+            self.output_data = self.batch_output_data[i]
+            try:
+                results[i] = func(*args, **kwargs)
+            except Exception as err:
+                results[i] = err
+
+        if self.process_name is None or len(inputs) == 1:
+            for i, (input_data, filename) in enumerate(inputs):
+                collect(i, self.transform, input_data, filename=filename)
+            return results
+
+        payloads = {}
+        for i, (input_data, filename) in enumerate(inputs):
+            try:
+                payloads[i] = self.get_payload(input_data, filename)
+            except Exception as err:
+                results[i] = err
+
+        api_results = execute_api_processes(self.process_name,
+                                            list(payloads.values()))
+        for i, result in zip(payloads.keys(), api_results):
+            if isinstance(result, Exception):
+                results[i] = result
+                continue
+            collect(i, self.load_result, result, inputs[i][1])
+
+        return results
+
     def notify(self, identifier: str, storage_path: str,
                datetime_: str,
                geometry: dict = None,
                wigos_station_identifier: str = None,
-               is_update: bool = False) -> bool:
+               is_update: bool = False, data: bytes = None,
+               checksum: str = None) -> bool:
         """
         Send notification of data to broker
 
+        While items are published (see `publish`), notifications are
+        collected and sent together once all items are published.
+
         :param storage_path: path to data on storage
         :param identifier: identifier
         :param datetime_: `datetime` object of temporal aspect of data
         :param geometry: `dict` of GeoJSON geometry object
         :param wigos_station_identifier: WSI associated with the data
+        :param is_update: `bool` of whether the data replaces published data
+        :param data: `bytes` of data, to avoid reading it back from storage
+        :param checksum: `str` of digest of data (see `get_digest`), to
+                         avoid hashing it again
 
         :returns: `bool` of result
         """
@@ -162,34 +225,44 @@ class BaseAbstractData:
             f"{metadata_id.replace('urn:wmo:md:','')}/{identifier}",
             metadata_id, storage_path, datetime_, geometry,
             wigos_station_identifier, self.gts,
-            operation)
+            operation, data=data, checksum=checksum,
+            length=None if data is None else len(data))
 
-        # load plugin for public broker
-        defs = {
-            'codepath': PLUGINS['pubsub']['mqtt']['plugin'],
-            'url': BROKER_PUBLIC,
-            'client_type': 'publisher'
-        }
-        broker = load_plugin('pubsub', defs)
+        notification = (topic, wis_message.dumps())
+        if self._notifications is not None:
+            # sent together once all items are published
+            self._notifications.append(notification)
+            return True
+
+        return self.publish_notifications([notification])
+
+    def publish_notifications(self, notifications: list) -> bool:
+        """
+        Send notifications of data to the public broker at once, and a
+        copy to the internal broker
+
+        :param notifications: `list` of tuples of topic and message
 
-        # publish using filename as identifier
-        success = broker.pub(topic, wis_message.dumps())
+        :returns: `bool` of result
+        """
+
+        broker = load_publisher(BROKER_PUBLIC)
+        success = broker.publish_batch(notifications)
         if not success:
-            LOGGER.error('Failed to publish data notification message on public broker') # noqa
+            LOGGER.error('Failed to publish data notification messages on public broker') # noqa
             return False
         else:
-            LOGGER.info(f'WISNotificationMessage published for {identifier}')
+            LOGGER.info(f'{len(notifications)} WISNotificationMessages published') # noqa
 
-        # load plugin for local broker
-        defs_local = {
-            'codepath': PLUGINS['pubsub']['mqtt']['plugin'],
-            'url': DOCKER_BROKER, # noqa
-            'client_type': 'notify-publisher'
-        }
-        local_broker = load_plugin('pubsub', defs_local)
-        success = local_broker.pub('wis2box/notifications', wis_message.dumps(), qos=0) # noqa
-        if not success:
-            LOGGER.error('Failed to publish notification message on internal broker') # noqa
+        # the internal copy is only used for monitoring, so it is not
+        # waited for
+        def on_done(future):
+            if not future.result():
+                LOGGER.error('Failed to publish notification message on internal broker') # noqa
+
+        local_broker = load_publisher(DOCKER_BROKER)
+        for _, message in notifications:
+            local_broker.publish_async('wis2box/notifications', message, qos=0).add_done_callback(on_done) # noqa
         return True
 
     def publish(self) -> bool:
@@ -201,8 +274,24 @@ class BaseAbstractData:
 
         LOGGER.info('Publishing output data')
 
-        for identifier, item in self.output_data.items():
-            self.publish_item(identifier, item)
+        self._notifications = []
+        try:
+            # items are independent, and publish_item handles its own
+            # errors
+            if len(self.output_data) > 1 and HANDLER_PUBLISH_CONCURRENCY > 1:
+                max_workers = min(HANDLER_PUBLISH_CONCURRENCY,
+                                  len(self.output_data))
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    list(executor.map(self.publish_item,
+                                      self.output_data.keys(),
+                                      self.output_data.values()))
+            else:
+                for identifier, item in self.output_data.items():
+                    self.publish_item(identifier, item)
+        finally:
+            notifications, self._notifications = self._notifications, None
+        if notifications:
+            self.publish_notifications(notifications)
         return True
 
     def publish_item(self, identifier, item) -> bool:
@@ -241,12 +330,20 @@ class BaseAbstractData:
                 data_bytes = self.as_bytes(the_data)
                 storage_path = f'{STORAGE_SOURCE}/{STORAGE_PUBLIC}/{rfp}/{identifier}.{format_}'  # noqa
 
+                digest = self.get_digest(data_bytes)
+
                 is_update = False
                 is_new = True
                 # check if storage_path already exists
-                if exists(storage_path):
-                    # if data exists, check if it is the same
-                    if data_bytes == get_data(storage_path):
+                metadata = get_metadata(storage_path)
+                if metadata is not None:
+                    # if data exists, check if it is the same, comparing
+                    # digests (or the data itself for legacy objects)
+                    if DIGEST_METADATA_KEY in metadata:
+                        is_same = metadata[DIGEST_METADATA_KEY] == digest
+                    else:
+                        is_same = data_bytes == get_data(storage_path)
+                    if is_same:
                         LOGGER.error(f'Data already published for {identifier}-{format_}; not publishing')  # noqa
                         is_new = False
                     else:
@@ -254,7 +351,8 @@ class BaseAbstractData:
                         is_update = True
                 if is_new:
                     LOGGER.info(f'Writing data to {storage_path}')
-                    put_data(data_bytes, storage_path)
+                    put_data(data_bytes, storage_path,
+                             metadata={DIGEST_METADATA_KEY: digest})
 
                 if self.enable_notification and is_new:
                     LOGGER.debug('Sending notification to broker')
@@ -264,7 +362,8 @@ class BaseAbstractData:
                         datetime_ = item['_meta'].get('data_date')
                     self.notify(identifier, storage_path,
                                 datetime_,
-                                item['_meta'].get('geometry'), wsi, is_update)
+                                item['_meta'].get('geometry'), wsi, is_update,
+                                data=data_bytes, checksum=digest)
                 else:
                     LOGGER.debug('No notification sent')
         except Exception as err:
@@ -286,8 +385,8 @@ class BaseAbstractData:
         :returns: `bool` of vadidation result
         """
 
-        LOGGER.debug(f'Validating {filename} against {self.file_filter}')
-        return re.match(self.file_filter, filename)
+        LOGGER.debug(f'Validating {filename} against {self.file_filter.pattern}') # noqa
+        return self.file_filter.match(filename)
 
     def files(self) -> Iterator[str]:
         """
@@ -312,17 +411,46 @@ class BaseAbstractData:
 
         raise NotImplementedError()
 
+    @staticmethod
+    def get_digest(data: bytes) -> str:
+        """
+        Get digest of data, as used in data notifications (SHA512)
+
+        :param data: `bytes` of data
+
+        :returns: `str` of base64-encoded SHA512 digest
+        """
+
+        return base64.b64encode(hashlib.sha512(data).digest()).decode()
+
+    @staticmethod
+    def get_item_data(data_item: dict) -> bytes:
+        """
+        Get data of a data item in a wis2box-api process result
+
+        :param data_item: `dict` of data item, with data either inlined
+                          base64-encoded or referenced by URL
+
+        :returns: `bytes` of data
+        """
+
+        if data_item.get('data_url'):
+            return get_api_data(data_item['data_url'])
+
+        return base64.b64decode(data_item['data'].encode('utf-8'))
+
     @staticmethod
     def as_bytes(input_data):
         """Return input data as bytes
 
-        :param input_data: `str`, `bytes` or `Path` of data
+        :param input_data: `str`, `bytes`, `memoryview` or `Path` of data
 
-        :returns: `bytes` of data
+        :returns: `bytes` of data, or `memoryview` of shared buffer
         """
 
         LOGGER.debug(f'input data is type: {type(input_data)}')
-        if isinstance(input_data, bytes):
+        if isinstance(input_data, (bytes, memoryview)):
+            # shared read-only buffers are used as is
             return input_data
         elif isinstance(input_data, str):
             return str(input_data).encode()
@@ -337,18 +465,18 @@ class BaseAbstractData:
     def as_string(input_data, base64_encode=False):
         """Return input data as string
 
-        :param input_data: `str`, `bytes` or `Path` of data
+        :param input_data: `str`, `bytes`, `memoryview` or `Path` of data
         :param base64_encode: `bool` if to use base64-encode before decoding
 
         :returns: `str` of data
         """
 
         LOGGER.debug(f'input data is type: {type(input_data)}')
-        if isinstance(input_data, bytes):
+        if isinstance(input_data, (bytes, memoryview)):
             if base64_encode:
                 return base64.b64encode(input_data).decode('utf-8')
             else:
-                return input_data.decode('utf-8')
+                return str(input_data, 'utf-8')
         elif isinstance(input_data, str):
             return input_data
         elif isinstance(input_data, Path):
@@ -28,6 +28,7 @@ from typing import Union
 
 from wis2box.api import execute_api_process
 from wis2box.data.geojson import ObservationDataGeoJSON
+from wis2box.storage import DataURL
 
 LOGGER = logging.getLogger(__name__)
 
@@ -35,21 +36,41 @@ LOGGER = logging.getLogger(__name__)
 class ObservationDataBUFR2GeoJSON(ObservationDataGeoJSON):
     """Observation data"""
 
+    process_name = 'bufr2geojson'
+    data_url_input = True
+
     def transform(self, input_data: Union[Path, bytes],
                   filename: str = '') -> bool:
 
+        if isinstance(input_data, Path):
+            filename = input_data.name
+
+        payload = self.get_payload(input_data, filename)
+        result = execute_api_process(self.process_name, payload)
+
+        return self.load_result(result, filename)
+
+    def get_payload(self, input_data: Union[Path, bytes],
+                    filename: str = '') -> dict:
+        """
+        Get wis2box-api process payload of input data
+
+        :param input_data: `bytes`, `Path` or `DataURL` of data
+        :param filename: `str` of filename
+
+        :returns: `dict` of process payload
+        """
+
         LOGGER.debug('Procesing BUFR data')
         if isinstance(input_data, Path):
             LOGGER.debug('input_data is a Path')
             filename = input_data.name
 
         if self.validate_filename_pattern(filename) is None:
-            msg = f'{filename} did not match {self.file_filter}'
+            msg = f'{filename} did not match {self.file_filter.pattern}'
             LOGGER.error(msg)
             raise ValueError(msg)
 
-        process_name = 'bufr2geojson'
-
         # check if input_data is Path object
         if isinstance(input_data, Path):
             payload = {
@@ -57,6 +78,14 @@ class ObservationDataBUFR2GeoJSON(ObservationDataGeoJSON):
                     'data_url': input_data.as_posix()
                 }
             }
+        elif isinstance(input_data, DataURL):
+            LOGGER.debug('input_data is a URL')
+            # kept as DataURL, identifying the data for the result cache
+            payload = {
+                'inputs': {
+                    'data_url': input_data
+                }
+            }
         else:
             input_bytes = self.as_bytes(input_data)
             payload = {
@@ -65,7 +94,17 @@ class ObservationDataBUFR2GeoJSON(ObservationDataGeoJSON):
                 }
             }
 
-        result = execute_api_process(process_name, payload)
+        return payload
+
+    def load_result(self, result: dict, filename: str = '') -> bool:
+        """
+        Add items of a wis2box-api process result to output data
+
+        :param result: `dict` of process result
+        :param filename: `str` of input filename
+
+        :returns: `bool` of processing result
+        """
 
         # check for errors
         if result.get('error') not in [None, '']:
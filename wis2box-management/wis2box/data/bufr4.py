@@ -19,7 +19,6 @@
 #
 ###############################################################################
 
-import base64
 import logging
 
 from datetime import datetime
@@ -34,6 +33,9 @@ LOGGER = logging.getLogger(__name__)
 
 class ObservationDataBUFR(BaseAbstractData):
     """Observation data"""
+
+    process_name = 'wis2box-bufr2bufr'
+
     def __init__(self, defs: dict) -> None:
         """
         ObservationDataBUFR data initializer
@@ -48,6 +50,25 @@ class ObservationDataBUFR(BaseAbstractData):
     def transform(self, input_data: Union[Path, bytes],
                   filename: str = '') -> bool:
 
+        if isinstance(input_data, Path):
+            filename = input_data.name
+
+        payload = self.get_payload(input_data, filename)
+        result = execute_api_process(self.process_name, payload)
+
+        return self.load_result(result, filename)
+
+    def get_payload(self, input_data: Union[Path, bytes],
+                    filename: str = '') -> dict:
+        """
+        Get wis2box-api process payload of input data
+
+        :param input_data: `bytes` or `Path` of data
+        :param filename: `str` of filename
+
+        :returns: `dict` of process payload
+        """
+
         LOGGER.debug('Processing BUFR4')
 
         if isinstance(input_data, Path):
@@ -55,7 +76,7 @@ class ObservationDataBUFR(BaseAbstractData):
             filename = input_data.name
 
         if self.validate_filename_pattern(filename) is None:
-            msg = f'{filename} did not match {self.file_filter}'
+            msg = f'{filename} did not match {self.file_filter.pattern}'
             LOGGER.error(msg)
             raise ValueError(msg)
 
@@ -70,8 +91,17 @@ class ObservationDataBUFR(BaseAbstractData):
             }
         }
 
-        process_name = 'wis2box-bufr2bufr'
-        result = execute_api_process(process_name, payload)
+        return payload
+
+    def load_result(self, result: dict, filename: str = '') -> bool:
+        """
+        Add data items of a wis2box-api process result to output data
+
+        :param result: `dict` of process result
+        :param filename: `str` of input filename
+
+        :returns: `bool` of processing result
+        """
 
         try:
             # check for errors
@@ -98,8 +128,8 @@ class ObservationDataBUFR(BaseAbstractData):
             filename = data_item['filename']
             suffix = filename.split('.')[-1]
             rmk = filename.split('.')[0]
-            # convert data_item['data'] to bytes
-            input_bytes = base64.b64decode(data_item['data'].encode('utf-8'))
+            # get data_item data as bytes, inlined or by reference
+            input_bytes = self.get_item_data(data_item)
             # define _meta
             _meta = data_item['_meta']
             # convert isoformat to datetime
@@ -19,7 +19,6 @@
 #
 ###############################################################################
 
-import base64
 import logging
 
 from datetime import datetime
@@ -35,6 +34,9 @@ LOGGER = logging.getLogger(__name__)
 
 class ObservationDataCSV2BUFR(BaseAbstractData):
     """Observation data"""
+
+    process_name = 'wis2box-csv2bufr'
+
     def __init__(self, defs: dict) -> None:
         """
         ObservationDataCSV2BUFR data initializer
@@ -49,6 +51,25 @@ class ObservationDataCSV2BUFR(BaseAbstractData):
     def transform(self, input_data: Union[Path, bytes],
                   filename: str = '') -> bool:
 
+        if isinstance(input_data, Path):
+            filename = input_data.name
+
+        payload = self.get_payload(input_data, filename)
+        result = execute_api_process(self.process_name, payload)
+
+        return self.load_result(result, filename)
+
+    def get_payload(self, input_data: Union[Path, bytes],
+                    filename: str = '') -> dict:
+        """
+        Get wis2box-api process payload of input data
+
+        :param input_data: `bytes` or `Path` of data
+        :param filename: `str` of filename
+
+        :returns: `dict` of process payload
+        """
+
         LOGGER.debug('Processing CSV data')
 
         if isinstance(input_data, Path):
@@ -56,7 +77,7 @@ class ObservationDataCSV2BUFR(BaseAbstractData):
             filename = input_data.name
 
         if self.validate_filename_pattern(filename) is None:
-            msg = f'{filename} did not match {self.file_filter}'
+            msg = f'{filename} did not match {self.file_filter.pattern}'
             LOGGER.error(msg)
             raise ValueError(msg)
 
@@ -73,8 +94,17 @@ class ObservationDataCSV2BUFR(BaseAbstractData):
             }
         }
 
-        process_name = 'wis2box-csv2bufr'
-        result = execute_api_process(process_name, payload)
+        return payload
+
+    def load_result(self, result: dict, filename: str = '') -> bool:
+        """
+        Add data items of a wis2box-api process result to output data
+
+        :param result: `dict` of process result
+        :param filename: `str` of input filename
+
+        :returns: `bool` of processing result
+        """
 
         try:
             # check for errors
@@ -96,8 +126,8 @@ class ObservationDataCSV2BUFR(BaseAbstractData):
             filename = data_item['filename']
             suffix = filename.split('.')[-1]
             rmk = filename.split('.')[0]
-            # convert data_item['data'] to bytes
-            input_bytes = base64.b64decode(data_item['data'].encode('utf-8'))
+            # get data_item data as bytes, inlined or by reference
+            input_bytes = self.get_item_data(data_item)
             # define _meta
             _meta = data_item['_meta']
             # convert isoformat to datetime
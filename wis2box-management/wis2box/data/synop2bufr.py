@@ -19,7 +19,6 @@
 #
 ###############################################################################
 
-import base64
 import logging
 
 from datetime import datetime, timedelta
@@ -34,6 +33,9 @@ LOGGER = logging.getLogger(__name__)
 
 class ObservationDataSYNOP2BUFR(BaseAbstractData):
     """Synoptic observation data"""
+
+    process_name = 'wis2box-synop2bufr'
+
     def __init__(self, defs: dict) -> None:
         """
         ObservationDataSYNOP2BUFR data initializer
@@ -48,6 +50,25 @@ class ObservationDataSYNOP2BUFR(BaseAbstractData):
     def transform(self, input_data: Union[Path, bytes],
                   filename: str = '', _meta: dict = None) -> bool:
 
+        if isinstance(input_data, Path):
+            filename = input_data.name
+
+        payload = self.get_payload(input_data, filename)
+        result = execute_api_process(self.process_name, payload)
+
+        return self.load_result(result, filename)
+
+    def get_payload(self, input_data: Union[Path, bytes],
+                    filename: str = '') -> dict:
+        """
+        Get wis2box-api process payload of input data
+
+        :param input_data: `bytes` or `Path` of data
+        :param filename: `str` of filename
+
+        :returns: `dict` of process payload
+        """
+
         LOGGER.debug('Processing SYNOP ASCII data')
 
         if isinstance(input_data, Path):
@@ -57,7 +78,7 @@ class ObservationDataSYNOP2BUFR(BaseAbstractData):
         file_match = self.validate_filename_pattern(filename)
 
         if file_match is None:
-            msg = f'{filename} did not match {self.file_filter}'
+            msg = f'{filename} did not match {self.file_filter.pattern}'
             LOGGER.error(msg)
             raise ValueError(msg)
 
@@ -68,7 +89,7 @@ class ObservationDataSYNOP2BUFR(BaseAbstractData):
             year = int(file_match.group(1))
             month = int(file_match.group(2))
         except IndexError:
-            msg = f'Failed to parse year/month from filename: {filename} using {self.file_filter}' # noqa
+            msg = f'Failed to parse year/month from filename: {filename} using {self.file_filter.pattern}' # noqa
             LOGGER.error(msg)
             raise ValueError(msg)
 
@@ -96,8 +117,17 @@ class ObservationDataSYNOP2BUFR(BaseAbstractData):
             }
         }
 
-        process_name = 'wis2box-synop2bufr'
-        result = execute_api_process(process_name, payload)
+        return payload
+
+    def load_result(self, result: dict, filename: str = '') -> bool:
+        """
+        Add data items of a wis2box-api process result to output data
+
+        :param result: `dict` of process result
+        :param filename: `str` of input filename
+
+        :returns: `bool` of processing result
+        """
 
         try:
             # check for errors
@@ -119,8 +149,8 @@ class ObservationDataSYNOP2BUFR(BaseAbstractData):
             filename = data_item['filename']
             suffix = filename.split('.')[-1]
             rmk = filename.split('.')[0]
-            # convert data_item['data'] to bytes
-            input_bytes = base64.b64decode(data_item['data'].encode('utf-8'))
+            # get data_item data as bytes, inlined or by reference
+            input_bytes = self.get_item_data(data_item)
             # define _meta
             _meta = data_item['_meta']
             # convert isoformat to datetime
@@ -47,13 +47,13 @@ class UniversalData(BaseAbstractData):
         match = self.validate_filename_pattern(filename.name)
 
         if match is None:
-            msg = f'{filename} did not match {self.file_filter}'
+            msg = f'{filename} did not match {self.file_filter.pattern}'
             LOGGER.error(msg)
             raise ValueError(msg)
         try:
             date_time = match.group(1)
         except IndexError:
-            msg = f'Failed to match first group in filename: {filename} using {self.file_filter}'  # noqa: E501
+            msg = f'Failed to match first group in filename: {filename} using {self.file_filter.pattern}'  # noqa: E501
             LOGGER.error(msg)
             raise ValueError(msg)
 
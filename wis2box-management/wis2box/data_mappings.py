@@ -19,17 +19,35 @@
 #
 ###############################################################################
 
+import csv
+import importlib
+import json
 import logging
+import os
+import re
+from types import MappingProxyType
+from uuid import uuid4
 
 from typing import Any, Tuple
 
 from owslib.ogcapi.records import Records
 
-from wis2box.env import (DOCKER_BROKER, DOCKER_API_URL)
-from wis2box.plugin import load_plugin, PLUGINS
+from wis2box.env import (DATADIR, DOCKER_BROKER, DOCKER_API_URL)
+from wis2box.plugin import get_plugin_class
+from wis2box.publisher import load_publisher
+from wis2box.util import fork_safe_lock, SubstringIndex
 
 LOGGER = logging.getLogger(__name__)
 
+# routing index of the latest data mappings seen by this process
+_INDEX = (None, None)
+# plugin definitions per dataset and file type of the latest data mappings
+_CONTEXTS = (None, {})
+# substring index of the latest GTS mappings seen by this process
+_GTS_INDEX = (None, None)
+# the caches above are shared by the threads of a process
+_CACHE_LOCK = fork_safe_lock()
+
 
 def get_plugins(record: dict) -> list:
     """
@@ -53,47 +71,223 @@ def get_plugins(record: dict) -> list:
     return plugins
 
 
-def refresh_data_mappings():
-    # load plugin for local broker and publish refresh request
-    defs_local = {
-        'codepath': PLUGINS['pubsub']['mqtt']['plugin'],
-        'url': DOCKER_BROKER,
-        'client_type': 'dataset-manager'
-    }
-    local_broker = load_plugin('pubsub', defs_local)
-    success = local_broker.pub('wis2box/data_mappings/refresh', '{}', qos=0)
+def preload_plugins(data_mappings: dict) -> None:
+    """
+    Import the modules of all data plugins used in data mappings, so that
+    forked workers start with the plugins already loaded
+
+    :param data_mappings: `dict` of data mappings
+
+    :returns: `None`
+    """
+
+    packagenames = set()
+    for value in data_mappings.values():
+        for plugins in value.get('plugins', {}).values():
+            for plugin in plugins:
+                packagenames.add(plugin['plugin'].rsplit('.', 1)[0])
+
+    for packagename in packagenames:
+        LOGGER.debug(f'Preloading {packagename}')
+        try:
+            importlib.import_module(packagename)
+        except Exception as err:
+            LOGGER.warning(f'Failed to preload {packagename}: {err}')
+
+
+class DatasetIndex:
+    """
+    Routing index of data mappings, matching a path to a dataset in time
+    proportional to the length of the path
+    """
+
+    def __init__(self, data_mappings: dict) -> None:
+        """
+        Dataset index initializer
+
+        :param data_mappings: `dict` of data mappings
+
+        :returns: `None`
+        """
+
+        self.data_mappings = data_mappings
+        # metadata identifiers are matched with ':' replaced by '.'
+        self._ids = {}
+        self._topics = {}
+        for key, value in data_mappings.items():
+            self._ids.setdefault(key.replace(':', '.'), []).append(key)
+            topic = value['topic_hierarchy'].replace('origin/a/wis2/', '')
+            self._topics.setdefault(topic, []).append(key)
+
+        self.ids = SubstringIndex(self._ids)
+        self.topics = SubstringIndex(self._topics)
+
+    def match(self, path: str) -> Tuple[str, str]:
+        """
+        Match path to a dataset
+
+        Metadata identifiers take precedence over topic hierarchies, and
+        the longest match wins.  Ambiguous matches are logged.
+
+        :param path: `str` of path
+
+        :returns: tuple of metadata_id and topic hierarchy
+        """
+
+        for index, keys, text in [(self.ids, self._ids, path.replace(':', '.')), # noqa
+                                  (self.topics, self._topics, path)]:
+            found = index.search(text)
+            if not found:
+                continue
+
+            pattern = sorted(found, key=lambda p: (-len(p), p))[0]
+            metadata_id = keys[pattern][0]
+            # matches contained in the longest match are not ambiguous
+            others = [key for p in found for key in keys[p]
+                      if key != metadata_id and (p == pattern or p not in pattern)] # noqa
+            if others:
+                LOGGER.warning(f'{path} matches several datasets, using {metadata_id} over {sorted(others)}') # noqa
+
+            return metadata_id, self.data_mappings[metadata_id]['topic_hierarchy'] # noqa
+
+        options = [key for key in self.data_mappings.keys()] # noqa
+        options += [v['topic_hierarchy'].replace('origin/a/wis2/', '') for v in self.data_mappings.values()]  # noqa
+        msg = f'Could not match {path} to dataset, path should include one of the following: {options}'  # noqa
+        raise ValueError(msg)
+
+    def __repr__(self):
+        return f'<DatasetIndex ({len(self.data_mappings)} datasets)>'
+
+
+class DataMappings(dict):
+    """
+    Data mappings, keyed by metadata identifier
+
+    The version is incremented on every change, so that subscribers can
+    apply changes incrementally and detect when they missed one.
+    """
+
+    def __init__(self, *args, version: int = 0, token: str = None,
+                 **kwargs) -> None:
+        """
+        Data mappings initializer
+
+        :param version: `int` of data mappings version
+        :param token: `str` identifying the data mappings load that this
+                      version derives from
+
+        :returns: `None`
+        """
+
+        super().__init__(*args, **kwargs)
+        self.version = version
+        self.token = token or uuid4().hex
+
+    @property
+    def index(self) -> DatasetIndex:
+        """
+        Routing index of the data mappings, built once per version
+
+        :returns: `DatasetIndex` of data mappings
+        """
+
+        global _INDEX
+
+        key = (self.token, self.version)
+        with _CACHE_LOCK:
+            if _INDEX[0] != key:
+                LOGGER.debug(f'Building routing index of {self}')
+                _INDEX = (key, DatasetIndex(self))
+            index = _INDEX[1]
+
+        return index
+
+    def patch(self, metadata_id: str, value: dict = None) -> 'DataMappings':
+        """
+        Get a copy of the data mappings with one dataset changed
+
+        :param metadata_id: `str` of metadata identifier
+        :param value: `dict` of data mappings of the dataset, or `None`
+                      to remove the dataset
+
+        :returns: `DataMappings` of next version
+        """
+
+        data_mappings = DataMappings(self, version=self.version + 1,
+                                     token=self.token)
+        if value is None:
+            data_mappings.pop(metadata_id, None)
+        else:
+            data_mappings[metadata_id] = value
+
+        return data_mappings
+
+    def __repr__(self):
+        return f'<DataMappings (version={self.version}, {len(self)} datasets)>' # noqa
+
+
+def refresh_data_mappings(patch: dict = None):
+    """
+    Request subscribers to refresh their data mappings
+
+    :param patch: `dict` of change to apply (`metadata_id`,
+                  `data_mappings` and `version`), or `None` to request
+                  a full reload
+
+    :returns: `None`
+    """
+
+    # publish refresh request on local broker
+    local_broker = load_publisher(DOCKER_BROKER)
+    success = local_broker.pub('wis2box/data_mappings/refresh',
+                               json.dumps(patch or {}), qos=0)
     if not success:
         LOGGER.error('Failed to refresh data mappings')
 
 
-def get_data_mappings() -> dict:
+def get_data_mapping(record: dict) -> dict:
+    """
+    Get data mappings of a discovery metadata record
+
+    :param record: `dict` of discovery metadata record
+
+    :returns: `dict` of data mappings definition, or `None` if the record
+              has no data mappings
+    """
+
+    # skip records without data mappings
+    if 'wis2box' not in record:
+        return None
+    if 'topic_hierarchy' not in record['wis2box']:
+        return None
+    if 'data_mappings' not in record['wis2box']:
+        return None
+    value = record['wis2box']['data_mappings']
+    if 'wmo:topicHierarchy' not in record['properties']:
+        LOGGER.info(f'No topic hierarchy for {record["id"]}')
+        return None
+    value['topic_hierarchy'] = record['properties']['wmo:topicHierarchy']
+
+    return value
+
+
+def get_data_mappings() -> DataMappings:
     """
     Get data mappings
 
-    :returns: `dict` of data mappings definitions
+    :returns: `DataMappings` of data mappings definitions
     """
 
-    data_mappings = {}
+    data_mappings = DataMappings()
 
     oar = Records(DOCKER_API_URL)
 
     try:
         records = oar.collection_items('discovery-metadata')
         for record in records['features']:
-            # skip records without data mappings
-            if 'wis2box' not in record:
-                continue
-            if 'topic_hierarchy' not in record['wis2box']:
-                continue
-            if 'data_mappings' not in record['wis2box']:
-                continue
-            value = record['wis2box']['data_mappings']
-            if 'wmo:topicHierarchy' not in record['properties']:
-                LOGGER.info(f'No topic hierarchy for {record["id"]}')
-                continue
-            value['topic_hierarchy'] = record['properties']['wmo:topicHierarchy'] # noqa
-            metadata_id = record['id']
-            data_mappings[metadata_id] = value
+            value = get_data_mapping(record)
+            if value is not None:
+                data_mappings[record['id']] = value
     except Exception as err:
         msg = f'Issue loading data mappings: {err}'
         LOGGER.error(msg)
@@ -102,6 +296,198 @@ def get_data_mappings() -> dict:
     return data_mappings
 
 
+def match_dataset(path: str, data_mappings: dict) -> Tuple[str, str]:
+    """
+    Match path to a dataset in data mappings
+
+    :param path: `str` of path
+    :param data_mappings: `dict` of data mappings
+
+    :returns: tuple of metadata_id and topic hierarchy
+    """
+
+    if isinstance(data_mappings, DataMappings):
+        index = data_mappings.index
+    else:
+        index = DatasetIndex(data_mappings)
+
+    return index.match(path)
+
+
+class GTSMappings(dict):
+    """
+    GTS headers (ttaaii, cccc), keyed by string to find in file paths
+
+    The version identifies the mapping file contents the mappings were
+    read from.
+    """
+
+    def __init__(self, *args, version: tuple = None, **kwargs) -> None:
+        """
+        GTS mappings initializer
+
+        :param version: `tuple` of mapping file modification time and size,
+                        or `None` if not read from a file
+
+        :returns: `None`
+        """
+
+        super().__init__(*args, **kwargs)
+        self.version = version
+
+    @property
+    def index(self) -> SubstringIndex:
+        """
+        Substring index of the GTS mappings, built once per version
+
+        :returns: `SubstringIndex` of GTS mappings keys
+        """
+
+        global _GTS_INDEX
+
+        if self.version is None:
+            return SubstringIndex(self)
+
+        with _CACHE_LOCK:
+            if _GTS_INDEX[0] != self.version:
+                _GTS_INDEX = (self.version, SubstringIndex(self))
+            index = _GTS_INDEX[1]
+
+        return index
+
+    def __repr__(self):
+        return f'<GTSMappings ({len(self)} headers)>'
+
+
+def get_gts_mappings_version() -> tuple:
+    """
+    Get version of the GTS mappings file in DATADIR
+
+    :returns: `tuple` of modification time and size of the mappings file,
+              or `None` if there is no mappings file
+    """
+
+    try:
+        stat = os.stat(f'{DATADIR}/gts_headers_mapping.csv')
+    except FileNotFoundError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_gts_mappings() -> GTSMappings:
+    """
+    Get GTS mappings from the CSV file in DATADIR
+
+    :returns: `GTSMappings` of GTS mappings
+    """
+
+    gts_mappings = GTSMappings(version=get_gts_mappings_version())
+    mapping_file = 'gts_headers_mapping.csv'
+    try:
+        with open(f'{DATADIR}/{mapping_file}', 'r') as f:
+            for row in csv.reader(f):
+                if len(row) < 3:
+                    continue
+                key, ttaaii, cccc = (value.strip() for value in row[:3])
+                if key == 'string_in_filepath':
+                    continue
+                value = {'ttaaii': ttaaii, 'cccc': cccc}
+                gts_mappings[key] = value
+                LOGGER.info(f'GTS mapping: string_in_filepath={key}, {value}')
+    except FileNotFoundError:
+        LOGGER.warning(f'To add GTS headers, please create {mapping_file} in WIS2BOX_HOST_DATADIR') # noqa
+    except Exception as err:
+        LOGGER.error(f'Error reading GTS mappings: {err}')
+    return gts_mappings
+
+
+def refresh_gts_mappings(gts_mappings: GTSMappings) -> GTSMappings:
+    """
+    Reload GTS mappings if the mappings file changed
+
+    :param gts_mappings: `GTSMappings` of current GTS mappings
+
+    :returns: `GTSMappings` of up to date GTS mappings
+    """
+
+    if get_gts_mappings_version() == gts_mappings.version:
+        return gts_mappings
+
+    LOGGER.info('GTS mappings file changed, reloading')
+    return get_gts_mappings()
+
+
+def get_gts_headers(path: str, gts_mappings: dict = None) -> dict:
+    """
+    Get GTS headers for a path
+
+    :param path: `str` of path
+    :param gts_mappings: `dict` of GTS mappings
+
+    :returns: `dict` of GTS headers (ttaaii, cccc), or `None` if no match
+    """
+
+    if not gts_mappings:
+        return None
+
+    if not isinstance(gts_mappings, GTSMappings):
+        gts_mappings = GTSMappings(gts_mappings)
+
+    # check if string defined by key is contained in path, the first key
+    # of the mappings wins
+    index = gts_mappings.index
+    found = index.search(path)
+    if not found:
+        return None
+
+    return gts_mappings[min(found, key=index.order.get)]
+
+
+def get_plugin_contexts(data_mappings: dict, metadata_id: str,
+                        file_type: str) -> Tuple[MappingProxyType]:
+    """
+    Get the definitions shared by the plugins of a dataset and file type,
+    built once per data mappings version
+
+    :param data_mappings: `dict` of data mappings
+    :param metadata_id: `str` of metadata identifier
+    :param file_type: `str` of file type
+
+    :returns: tuple of read-only `dict` of plugin definitions
+    """
+
+    global _CONTEXTS
+
+    cache = None
+    if isinstance(data_mappings, DataMappings):
+        key = (data_mappings.token, data_mappings.version)
+        with _CACHE_LOCK:
+            if _CONTEXTS[0] != key:
+                _CONTEXTS = (key, {})
+            cache = _CONTEXTS[1]
+            if (metadata_id, file_type) in cache:
+                return cache[(metadata_id, file_type)]
+
+    topic_hierarchy = data_mappings[metadata_id]['topic_hierarchy']
+    contexts = tuple(MappingProxyType({
+        'metadata_id': metadata_id,
+        'topic_hierarchy': topic_hierarchy,
+        'codepath': plugin['plugin'],
+        'pattern': re.compile(plugin['file-pattern']),
+        'template': plugin.get('template'),
+        'buckets': plugin.get('buckets', ()),
+        'notify': plugin.get('notify', False),
+        'format': file_type
+    }) for plugin in data_mappings[metadata_id]['plugins'][file_type])
+
+    if cache is not None:
+        with _CACHE_LOCK:
+            cache[(metadata_id, file_type)] = contexts
+
+    return contexts
+
+
 def validate_and_load(path: str,
                       data_mappings: dict = None,
                       gts_mappings: dict = None,
@@ -123,26 +509,7 @@ def validate_and_load(path: str,
     LOGGER.debug(f'Validating path: {path}')
     LOGGER.debug(f'Data mappings {data_mappings}')
 
-    metadata_id = None
-    topic_hierarchy = None
-    # determine if path matches a metadata_id
-    for key in data_mappings.keys():
-        # replace ':' with '.' for matching
-        if key.replace(':', '.') in path.replace(':', '.'):
-            metadata_id = key
-            topic_hierarchy = data_mappings[key]['topic_hierarchy']
-    # else try to match topic_hierarchy
-    if metadata_id is None:
-        for key, value in data_mappings.items():
-            if (value['topic_hierarchy']).replace('origin/a/wis2/', '') in path:  # noqa
-                metadata_id = key
-                topic_hierarchy = value['topic_hierarchy']
-                break
-    if metadata_id is None:
-        options = [key for key in data_mappings.keys()] # noqa
-        options += [v['topic_hierarchy'].replace('origin/a/wis2/', '') for v in data_mappings.values()]  # noqa
-        msg = f'Could not match {path} to dataset, path should include one of the following: {options}'  # noqa
-        raise ValueError(msg)
+    metadata_id, topic_hierarchy = match_dataset(path, data_mappings)
 
     if 'plugins' not in data_mappings[metadata_id]:
         msg = f'No plugins defined in data-mappings for metadata_id={metadata_id}' # noqa
@@ -162,28 +529,14 @@ def validate_and_load(path: str,
 
     LOGGER.debug(f'Adding plugin definition for {file_type}')
 
-    def data_defs(plugin):
-        notify = plugin.get('notify', False)
-        data_defs = {
-            'metadata_id': metadata_id,
-            'íncoming_filepath': path,
-            'topic_hierarchy': topic_hierarchy,
-            'codepath': plugin['plugin'],
-            'pattern': plugin['file-pattern'],
-            'template': plugin.get('template'),
-            'buckets': plugin.get('buckets', ()),
-            'notify': notify,
-            'format': file_type
-        }
-        if notify and gts_mappings:
-            for key in gts_mappings.keys():
-                # check if string defined by key is contained in path
-                if key in path:
-                    data_defs['gts_ttaaii'] = gts_mappings[key]['ttaaii']
-                    data_defs['gts_cccc'] = gts_mappings[key]['cccc']
-                    break
-        return data_defs
-
-    plugins_ = [load_plugin('data', data_defs(p), data_mappings)
-                for p in plugins[file_type]]
+    gts_headers = get_gts_headers(path, gts_mappings)
+
+    plugins_ = []
+    for context in get_plugin_contexts(data_mappings, metadata_id, file_type):
+        defs = dict(context, incoming_filepath=path)
+        if context['notify'] and gts_headers:
+            defs['gts_ttaaii'] = gts_headers['ttaaii']
+            defs['gts_cccc'] = gts_headers['cccc']
+        plugins_.append(get_plugin_class(context['codepath'])(defs))
+
     return metadata_id, plugins_
@@ -23,6 +23,7 @@ import click
 import logging
 import os
 from pathlib import Path
+import socket
 
 from wis2box import cli_helpers
 from wis2box.log import setup_logger
@@ -53,6 +54,8 @@ BROKER_HOST = os.environ.get('WIS2BOX_BROKER_HOST', 'mosquitto')
 BROKER_PORT = os.environ.get('WIS2BOX_BROKER_PORT', 1883)
 DOCKER_BROKER = f'mqtt://{BROKER_USERNAME}:{BROKER_PASSWORD}@{BROKER_HOST}:{BROKER_PORT}' # noqa
 BROKER_PUBLIC = os.environ.get('WIS2BOX_BROKER_PUBLIC', DOCKER_BROKER)
+BROKER_MAX_INFLIGHT = int(os.environ.get('WIS2BOX_BROKER_MAX_INFLIGHT', 100))
+BROKER_PUBLISH_TIMEOUT = float(os.environ.get('WIS2BOX_BROKER_PUBLISH_TIMEOUT', 10)) # noqa
 
 STORAGE_TYPE = os.environ.get('WIS2BOX_STORAGE_TYPE', 'S3')
 STORAGE_SOURCE = os.environ.get('WIS2BOX_STORAGE_SOURCE', 'http://minio:9000')
@@ -71,6 +74,35 @@ try:
 except TypeError:
     STORAGE_API_RETENTION_DAYS = None
 
+SUBSCRIBER_WORKERS = int(os.environ.get('WIS2BOX_SUBSCRIBER_WORKERS', os.cpu_count())) # noqa
+SUBSCRIBER_WORKER_MAX_TASKS = int(os.environ.get('WIS2BOX_SUBSCRIBER_WORKER_MAX_TASKS', 1000)) # noqa
+# workers share a memory budget of 512 MB by default
+SUBSCRIBER_WORKER_MAX_MEMORY = int(os.environ.get('WIS2BOX_SUBSCRIBER_WORKER_MAX_MEMORY', max(32, 512 // SUBSCRIBER_WORKERS))) # noqa
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get('WIS2BOX_SUBSCRIBER_QUEUE_SIZE', 1000)) # noqa
+SUBSCRIBER_QUEUE_TIMEOUT = float(os.environ.get('WIS2BOX_SUBSCRIBER_QUEUE_TIMEOUT', 1)) # noqa
+SUBSCRIBER_ENGINE = os.environ.get('WIS2BOX_SUBSCRIBER_ENGINE', 'process')
+SUBSCRIBER_SHARE_GROUP = os.environ.get('WIS2BOX_SUBSCRIBER_SHARE_GROUP')
+SUBSCRIBER_ASYNC_CONCURRENCY = int(os.environ.get('WIS2BOX_SUBSCRIBER_ASYNC_CONCURRENCY', 100)) # noqa
+SUBSCRIBER_DEDUP_SIZE = int(os.environ.get('WIS2BOX_SUBSCRIBER_DEDUP_SIZE', 10000)) # noqa
+SUBSCRIBER_DEDUP_TTL = float(os.environ.get('WIS2BOX_SUBSCRIBER_DEDUP_TTL', 3600)) # noqa
+SUBSCRIBER_MESSAGES_BATCH_SIZE = int(os.environ.get('WIS2BOX_SUBSCRIBER_MESSAGES_BATCH_SIZE', 500)) # noqa
+SUBSCRIBER_MESSAGES_INTERVAL = float(os.environ.get('WIS2BOX_SUBSCRIBER_MESSAGES_INTERVAL', 1)) # noqa
+# each subscriber of a share group keeps its own journal, named after its
+# host; a single subscriber keeps the same journal across restarts
+SUBSCRIBER_JOURNAL_TEMPLATE = os.environ.get('WIS2BOX_SUBSCRIBER_JOURNAL', f'{DATADIR}/subscriber-journal-{{hostname}}.db' if SUBSCRIBER_SHARE_GROUP else f'{DATADIR}/subscriber-journal.db') # noqa
+SUBSCRIBER_JOURNAL = SUBSCRIBER_JOURNAL_TEMPLATE.replace('{hostname}', socket.gethostname()) # noqa
+SUBSCRIBER_INFLIGHT = int(os.environ.get('WIS2BOX_SUBSCRIBER_INFLIGHT', SUBSCRIBER_ASYNC_CONCURRENCY if SUBSCRIBER_ENGINE == 'asyncio' else SUBSCRIBER_WORKERS)) # noqa
+API_POOL_SIZE = int(os.environ.get('WIS2BOX_API_POOL_SIZE', SUBSCRIBER_ASYNC_CONCURRENCY if SUBSCRIBER_ENGINE == 'asyncio' else 10)) # noqa
+API_TIMEOUT = float(os.environ.get('WIS2BOX_API_TIMEOUT', 300))
+API_RETRIES = int(os.environ.get('WIS2BOX_API_RETRIES', 3))
+API_CACHE_DIR = os.environ.get('WIS2BOX_API_CACHE_DIR')
+API_CACHE_SIZE = int(os.environ.get('WIS2BOX_API_CACHE_SIZE', 256))
+API_DATA_TRANSPORT = os.environ.get('WIS2BOX_API_DATA_TRANSPORT', 'inline')
+API_SYNC_MAX_SIZE = int(os.environ.get('WIS2BOX_API_SYNC_MAX_SIZE', 1024)) # noqa
+API_MAX_JOBS = max(1, int(os.environ.get('WIS2BOX_API_MAX_JOBS', 4)))
+HANDLER_SPOOL_SIZE = int(os.environ.get('WIS2BOX_HANDLER_SPOOL_SIZE', 16)) # noqa
+HANDLER_PUBLISH_CONCURRENCY = int(os.environ.get('WIS2BOX_HANDLER_PUBLISH_CONCURRENCY', 8)) # noqa
+
 LOGLEVEL = os.environ.get('WIS2BOX_LOGGING_LOGLEVEL', 'ERROR')
 LOGFILE = os.environ.get('WIS2BOX_LOGGING_LOGFILE', 'stdout')
 
@@ -105,6 +137,17 @@ if missing_environment_variables:
     LOGGER.error(msg)
     raise EnvironmentError(msg)
 
+if SUBSCRIBER_ENGINE not in ['process', 'asyncio']:
+    msg = 'WIS2BOX_SUBSCRIBER_ENGINE must be one of: process, asyncio'
+    LOGGER.error(msg)
+    raise EnvironmentError(msg)
+
+if (SUBSCRIBER_SHARE_GROUP and SUBSCRIBER_JOURNAL_TEMPLATE and
+        '{hostname}' not in SUBSCRIBER_JOURNAL_TEMPLATE):
+    msg = 'WIS2BOX_SUBSCRIBER_JOURNAL must contain {hostname} when WIS2BOX_SUBSCRIBER_SHARE_GROUP is set' # noqa
+    LOGGER.error(msg)
+    raise EnvironmentError(msg)
+
 if '@' in BROKER_PASSWORD:
     msg = 'WIS2BOX_BROKER_PASSWORD must not contain "@" character'
     LOGGER.error(msg)
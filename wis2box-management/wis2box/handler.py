@@ -19,18 +19,19 @@
 #
 ###############################################################################
 
+from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
 from pathlib import Path
 
 from wis2box.api import upsert_collection_item
-from wis2box.storage import get_data
+from wis2box.storage import get_data_buffer, get_data_url
 from wis2box.data_mappings import validate_and_load
 
-from wis2box.plugin import load_plugin
-from wis2box.plugin import PLUGINS
+from wis2box.publisher import load_publisher
 
-from wis2box.env import (DOCKER_BROKER, STORAGE_PUBLIC)
+from wis2box.env import (API_DATA_TRANSPORT, DOCKER_BROKER,
+                         HANDLER_SPOOL_SIZE, STORAGE_PUBLIC)
 
 LOGGER = logging.getLogger(__name__)
 
@@ -38,7 +39,8 @@ LOGGER = logging.getLogger(__name__)
 class Handler:
     def __init__(self, filepath: str,
                  data_mappings: dict = None,
-                 gts_mappings: dict = None) -> None:
+                 gts_mappings: dict = None,
+                 batch: list = ()) -> None:
         self.filepath = filepath
         self.plugins = ()
         self.input_bytes = None
@@ -52,10 +54,6 @@ class Handler:
             LOGGER.debug('filepath is a string')
             self.filetype = self.filepath.split('.')[-1]
 
-        # check if filepath is a url
-        if self.filepath.startswith('http'):
-            self.input_bytes = get_data(self.filepath)
-
         if '/metadata/' in self.filepath:
             msg = 'Passing on handling metadata in workflow'
             raise NotHandledError(msg)
@@ -70,61 +68,165 @@ class Handler:
             else:
                 raise ValueError(msg)
 
-    def publish_failure_message(self, description, plugin=None):
+        # further files of the same dataset and file type are transformed
+        # by the same plugins and published in one pass
+        self.filepaths = [self.filepath]
+        for filepath_ in batch:
+            if filepath_.split('.')[-1] != self.filetype:
+                msg = f'Cannot batch {filepath_} with {self.filetype} files'
+                raise ValueError(msg)
+            self.filepaths.append(filepath_)
+
+    def publish_failure_message(self, description, plugin=None,
+                                filepath=None):
         message = {
-            'filepath': self.filepath,
+            'filepath': filepath or self.filepath,
             'description': description
         }
         if plugin is not None:
             cl = plugin.__class__
             message['plugin'] = f'{cl.__module__ }.{cl.__name__}'
         # handler uses local broker to publish success/failure messages
-        defs = {
-            'codepath': PLUGINS['pubsub']['mqtt']['plugin'],
-            'url': DOCKER_BROKER, # noqa
-            'client_type': 'handler-publisher'
-        }
-        local_broker = load_plugin('pubsub', defs)
+        local_broker = load_publisher(DOCKER_BROKER)
         success = local_broker.pub('wis2box/handler', json.dumps(message), qos=0) # noqa
         if not success:
             msg = f'Failed to publish message: {message}'
             LOGGER.error(msg)
 
-    def handle(self) -> bool:
-        for plugin in self.plugins:
-            if not plugin.accept_file(self.filepath):
-                msg = f'Filepath not accepted: {self.filepath} for class {plugin.__class__}' # noqa
+    @staticmethod
+    def get_buffer(filepath: str):
+        """
+        Fetch a file once into a read-only buffer shared by all plugins
+
+        :param filepath: `str` of file path
+
+        :returns: `bytes`, or `memoryview` of a memory-mapped spool file
+                  for large files
+        """
+
+        return get_data_buffer(filepath,
+                               spool_size=HANDLER_SPOOL_SIZE * 1024 * 1024)
+
+    def get_input(self, filepath: str, by_reference: bool = False) -> tuple:
+        """
+        Get the transform arguments for a file
+
+        :param filepath: `str` of file path
+        :param by_reference: `bool` of whether the file can be passed on
+                             by URL instead of being fetched
+
+        :returns: `tuple` of input data and filename
+        """
+
+        # check if filepath is a url
+        if not filepath.startswith('http'):
+            return filepath, ''
+
+        if by_reference and API_DATA_TRANSPORT == 'reference':
+            return get_data_url(filepath), filepath.split('/')[-1]
+
+        if filepath == self.filepath:
+            if self.input_bytes is None:
+                self.input_bytes = self.get_buffer(filepath)
+            input_bytes = self.input_bytes
+        else:
+            input_bytes = self.get_buffer(filepath)
+
+        if input_bytes:
+            return input_bytes, filepath.split('/')[-1]
+        else:
+            return filepath, ''
+
+    def run_plugin(self, plugin, inputs: dict) -> set:
+        """
+        Transform and publish files with one plugin
+
+        :param plugin: data plugin object
+        :param inputs: `dict` of transform arguments by file path
+
+        :returns: `set` of file paths that failed
+        """
+
+        failed = set()
+        accepted = []
+        for filepath in self.filepaths:
+            if filepath not in inputs:
+                continue
+            if not plugin.accept_file(filepath):
+                msg = f'Filepath not accepted: {filepath} for class {plugin.__class__}' # noqa
                 LOGGER.debug(msg)
                 continue
-            try:
-                if self.input_bytes:
-                    plugin.transform(
-                        input_data=self.input_bytes,
-                        filename=self.filepath.split('/')[-1]
-                    )
-                else:
-                    plugin.transform(self.filepath)
-            except Exception as err:
-                msg = f'Failed to transform file {self.filepath} : {err}'
-                LOGGER.error(msg, exc_info=True)
+            accepted.append(filepath)
+
+        # files of a batch are transformed together, but published one
+        # by one, so that failures are reported against the right file
+        results = plugin.transform_batch(
+            [inputs[filepath] for filepath in accepted])
+        for i, (filepath, result) in enumerate(zip(accepted, results)):
+            if isinstance(result, Exception):
+                msg = f'Failed to transform file {filepath} : {result}'
+                LOGGER.error(msg, exc_info=result)
                 self.publish_failure_message(
                     description='Failed to transform file',
-                    plugin=plugin)
-                return False
+                    plugin=plugin, filepath=filepath)
+                failed.add(filepath)
+                continue
+            plugin.incoming_filepath = filepath
+            plugin.output_data = plugin.batch_output_data[i]
             try:
                 plugin.publish()
             except Exception as err:
-                msg = f'Failed to publish file {self.filepath}: {err}'
+                msg = f'Failed to publish file {filepath}: {err}'
                 LOGGER.error(msg, exc_info=True)
                 self.publish_failure_message(
                     description='Failed to publish file to api-backend',
-                    plugin=plugin)
-                return False
+                    plugin=plugin, filepath=filepath)
+                failed.add(filepath)
 
-        return True
+        return failed
+
+    def handle(self) -> bool:
+        # fetch every file once, for all plugins
+        inputs = {}
+        failed = set()
+        for filepath in self.filepaths:
+            plugins = [plugin for plugin in self.plugins
+                       if plugin.accept_file(filepath)]
+            if plugins:
+                # files are only fetched if a plugin needs their data
+                by_reference = all(plugin.data_url_input
+                                   for plugin in plugins)
+                try:
+                    inputs[filepath] = self.get_input(filepath, by_reference)
+                except Exception as err:
+                    msg = f'Failed to get file {filepath} : {err}'
+                    LOGGER.error(msg)
+                    self.publish_failure_message(
+                        description='Failed to get file',
+                        filepath=filepath)
+                    failed.add(filepath)
+
+        # plugins are independent and spend most of their time waiting on
+        # the API, so they run concurrently
+        if len(self.plugins) > 1:
+            with ThreadPoolExecutor(max_workers=len(self.plugins)) as executor: # noqa
+                results = list(executor.map(
+                    lambda plugin: self.run_plugin(plugin, inputs),
+                    self.plugins))
+        else:
+            results = [self.run_plugin(plugin, inputs)
+                       for plugin in self.plugins]
+
+        for plugin, failed_ in zip(self.plugins, results):
+            LOGGER.debug(f'{plugin.__class__.__name__}: {len(failed_)} files failed') # noqa
+            failed.update(failed_)
+
+        return not failed
 
     def publish(self) -> bool:
         index_name = self.metadata_id
+        if self.filepath.startswith('http'):
+            self.get_input(self.filepath)
         if self.input_bytes:
             geojson = json.load(self.input_bytes)
             upsert_collection_item(index_name, geojson)
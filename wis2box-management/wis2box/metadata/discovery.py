@@ -44,7 +44,7 @@ from wis2box.data_mappings import refresh_data_mappings, get_plugins
 from wis2box.env import (API_URL, BROKER_PUBLIC, DOCKER_API_URL,
                          STORAGE_PUBLIC, STORAGE_SOURCE, URL)
 from wis2box.metadata.base import BaseMetadata
-from wis2box.plugin import load_plugin, PLUGINS
+from wis2box.publisher import load_publisher
 from wis2box.pubsub.message import WISNotificationMessage
 from wis2box.storage import put_data, delete_data, exists
 from wis2box.util import json_serial
@@ -204,7 +204,8 @@ class DiscoveryMetadata(BaseMetadata):
 
 
 def publish_broker_message(record: dict, storage_path: str,
-                           centre_id: str, operation: str = 'create') -> str:
+                           centre_id: str, operation: str = 'create',
+                           data: bytes = None) -> str:
     """
     Publish discovery metadata to broker
 
@@ -212,6 +213,8 @@ def publish_broker_message(record: dict, storage_path: str,
     :param storage_path: `str` of storage path/object id
     :param centre_id: centre acronym
     :param operation: `str` of operation type (create, update, delete)
+    :param data: `bytes` of stored record, to avoid reading it back from
+                 storage
 
     :returns: `str` of WIS message
     """
@@ -225,15 +228,10 @@ def publish_broker_message(record: dict, storage_path: str,
                                          filepath=storage_path,
                                          datetime_=datetime_,
                                          geometry=record['geometry'],
-                                         operation=operation).dumps()
+                                         operation=operation,
+                                         data=data).dumps()
 
-    # load plugin for plugin-broker
-    defs = {
-        'codepath': PLUGINS['pubsub']['mqtt']['plugin'],
-        'url': BROKER_PUBLIC,
-        'client_type': 'publisher'
-    }
-    broker = load_plugin('pubsub', defs)
+    broker = load_publisher(BROKER_PUBLIC)
 
     success = broker.pub(topic, wis_message)
     if not success:
@@ -303,13 +301,7 @@ def publish_delete_notification(identifier: str):
         'generated_by': f'wis2box {__version__}'
     }
 
-    # load plugin for plugin-broker
-    defs = {
-        'codepath': PLUGINS['pubsub']['mqtt']['plugin'],
-        'url': BROKER_PUBLIC,
-        'client_type': 'publisher'
-    }
-    broker = load_plugin('pubsub', defs)
+    broker = load_publisher(BROKER_PUBLIC)
 
     success = broker.pub(topic, json.dumps(message, default=json_serial))
     if success:
@@ -471,7 +463,7 @@ def publish_discovery_metadata(metadata: Union[dict, str]):
     centre_id = record['id'].split(':')[3]
     try:
         message = publish_broker_message(record, storage_path,
-                                         centre_id, operation)
+                                         centre_id, operation, data_bytes)
     except Exception as err:
         msg = 'Failed to publish discovery metadata to public broker'
         LOGGER.error(msg)
@@ -43,7 +43,7 @@ from wis2box.env import (API_BACKEND_URL, DOCKER_API_URL,
                          BROKER_HOST, BROKER_USERNAME, BROKER_PASSWORD,
                          BROKER_PORT)
 from wis2box.metadata.base import BaseMetadata
-from wis2box.plugin import load_plugin, PLUGINS
+from wis2box.publisher import load_publisher
 from wis2box.util import get_typed_value
 
 
@@ -430,13 +430,8 @@ def publish_from_csv(path: Path, new_topic: str = None) -> None:
     notify_msg = {
         'station_list': station_list
     }
-    # load plugin for local broker
-    defs_local = {
-        'codepath': PLUGINS['pubsub']['mqtt']['plugin'],
-        'url': f'mqtt://{BROKER_USERNAME}:{BROKER_PASSWORD}@{BROKER_HOST}:{BROKER_PORT}', # noqa
-        'client_type': 'station-publisher'
-    }
-    local_broker = load_plugin('pubsub', defs_local)
+    local_broker = load_publisher(
+        f'mqtt://{BROKER_USERNAME}:{BROKER_PASSWORD}@{BROKER_HOST}:{BROKER_PORT}') # noqa
     local_broker.pub('wis2box/stations', json.dumps(notify_msg), qos=0)
 
 
@@ -24,8 +24,14 @@ import importlib
 import logging
 from typing import Any
 
+from wis2box.util import fork_safe_lock
+
 LOGGER = logging.getLogger(__name__)
 
+# plugin classes are resolved once per process
+_CLASSES = {}
+_CLASSES_LOCK = fork_safe_lock()
+
 PLUGINS = {
     'api_backend': {
         'Elasticsearch': {
@@ -110,18 +116,34 @@ def load_plugin(plugin_type: PluginTypes,
         LOGGER.exception(msg)
         raise InvalidPluginError(msg)
 
-    packagename, classname = codepath.rsplit('.', 1)
-
-    LOGGER.debug(f'Package name: {packagename}')
-    LOGGER.debug(f'Class name: {classname}')
-
-    module = importlib.import_module(packagename)
-    class_ = getattr(module, classname)
+    class_ = get_plugin_class(codepath)
     plugin = class_(defs)
 
     return plugin
 
 
+def get_plugin_class(codepath: str) -> type:
+    """
+    Get plugin class, importing its module on first use
+
+    :param codepath: `str` of plugin codepath (package and class name)
+
+    :returns: plugin class
+    """
+
+    with _CLASSES_LOCK:
+        if codepath not in _CLASSES:
+            packagename, classname = codepath.rsplit('.', 1)
+
+            LOGGER.debug(f'Package name: {packagename}')
+            LOGGER.debug(f'Class name: {classname}')
+
+            module = importlib.import_module(packagename)
+            _CLASSES[codepath] = getattr(module, classname)
+
+        return _CLASSES[codepath]
+
+
 class InvalidPluginError(Exception):
     """Invalid plugin"""
     pass
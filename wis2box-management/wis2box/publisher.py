@@ -0,0 +1,60 @@
+###############################################################################
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+###############################################################################
+
+import logging
+import os
+from typing import Any
+
+from wis2box.plugin import load_plugin, PLUGINS
+from wis2box.util import fork_safe_lock
+
+LOGGER = logging.getLogger(__name__)
+
+# publisher connections are kept open and reused within a process
+_PUBLISHERS = {}
+_PUBLISHERS_LOCK = fork_safe_lock()
+
+
+def load_publisher(url: str) -> Any:
+    """
+    Load pubsub plugin publishing to a broker, reusing its connection
+    within a process
+
+    :param url: `str` of broker RFC1738 URL
+
+    :returns: plugin object
+    """
+
+    key = (os.getpid(), url)
+    with _PUBLISHERS_LOCK:
+        if key not in _PUBLISHERS:
+            defs = {
+                'codepath': PLUGINS['pubsub']['mqtt']['plugin'],
+                'url': url,
+                'client_type': 'publisher'
+            }
+
+            LOGGER.debug('Connecting publisher to broker')
+            publisher = load_plugin('pubsub', defs)
+            publisher.start()
+            _PUBLISHERS[key] = publisher
+
+    return _PUBLISHERS[key]
@@ -19,9 +19,10 @@
 #
 ###############################################################################
 
+from concurrent.futures import Future
 from urllib.parse import urlparse
 import logging
-from typing import Any, Callable
+from typing import Any, Callable, Union
 
 LOGGER = logging.getLogger(__name__)
 
@@ -53,11 +54,67 @@ class BasePubSubClient:
 
         raise NotImplementedError()
 
-    def sub(self, topic: str) -> None:
+    def start(self) -> None:
         """
-        Subscribe to a broker/topic
+        Keep the connection open for repeated publishing
+
+        :returns: `None`
+        """
+
+        raise NotImplementedError()
+
+    def stop(self) -> None:
+        """
+        Close a connection kept open
+
+        :returns: `None`
+        """
+
+        raise NotImplementedError()
+
+    def publish_async(self, topic: str, message: str,
+                      qos: int = 1) -> Future:
+        """
+        Publish a message to a broker/topic without waiting for it to be
+        acknowledged
 
         :param topic: `str` of topic
+        :param message: `str` of message
+        :param qos: `int` of quality of service
+
+        :returns: `Future` resolving to `bool` of publish result
+        """
+
+        raise NotImplementedError()
+
+    def publish_batch(self, messages: list, qos: int = 1) -> bool:
+        """
+        Publish several messages without waiting for each to be acknowledged
+
+        :param messages: `list` of tuples of topic and message
+        :param qos: `int` of quality of service
+
+        :returns: `bool` of whether all messages were published
+        """
+
+        raise NotImplementedError()
+
+    def sub(self, topic: Union[str, list]) -> None:
+        """
+        Subscribe to a broker/topic
+
+        :param topic: `str` of topic, or `list` of topics
+
+        :returns: `None`
+        """
+
+        raise NotImplementedError()
+
+    async def sub_async(self, topic: Union[str, list]) -> None:
+        """
+        Subscribe to a broker/topic from a running asyncio event loop
+
+        :param topic: `str` of topic, or `list` of topics
 
         :returns: `None`
         """
@@ -0,0 +1,273 @@
+###############################################################################
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+###############################################################################
+
+from collections import deque, OrderedDict
+import logging
+import threading
+from time import monotonic
+from typing import Any, Callable
+
+LOGGER = logging.getLogger(__name__)
+
+# relative share of dispatches per priority lane
+LANE_WEIGHTS = {
+    'high': 8,
+    'normal': 4,
+    'low': 1
+}
+
+
+class IngestQueue:
+    """
+    Bounded queue of storage events awaiting processing
+
+    Events are kept in one lane per priority, and lanes are served by
+    smooth weighted round robin, so that high priority events overtake
+    bulk loads without starving them.  Each lane is bounded separately,
+    so that a bulk load filling its lane does not hold back events of
+    other priorities.
+    """
+
+    def __init__(self, maxsize: int = 1000) -> None:
+        """
+        Ingest queue initializer
+
+        :param maxsize: `int` of maximum number of queued events per lane
+
+        :returns: `None`
+        """
+
+        self.maxsize = maxsize
+        self._lanes = {lane: deque() for lane in LANE_WEIGHTS}
+        self._credits = {lane: 0 for lane in LANE_WEIGHTS}
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def _next_lane(self) -> str:
+        """
+        Select the lane to serve next
+
+        :returns: `str` of lane name
+        """
+
+        lanes = [lane for lane, events in self._lanes.items() if events]
+        total = sum(LANE_WEIGHTS[lane] for lane in lanes)
+        for lane in lanes:
+            self._credits[lane] += LANE_WEIGHTS[lane]
+        lane = max(lanes, key=lambda lane_: self._credits[lane_])
+        self._credits[lane] -= total
+
+        return lane
+
+    def put(self, event: dict, timeout: float = None,
+            priority: str = 'normal') -> bool:
+        """
+        Add an event to the queue, blocking while its lane is full
+
+        :param event: `dict` of storage event
+        :param timeout: `float` of seconds to wait for free space, after
+                        which the event is rejected, so that the queue
+                        stays bounded and the caller is never blocked
+                        indefinitely
+        :param priority: `str` of priority lane (`high`, `normal`, `low`)
+
+        :returns: `bool` of whether the event was queued
+        """
+
+        if priority not in self._lanes:
+            LOGGER.warning(f'Unknown priority {priority}, using normal')
+            priority = 'normal'
+
+        with self._cond:
+            if timeout is None:
+                deadline = None
+            else:
+                deadline = monotonic() + timeout
+            lane = self._lanes[priority]
+            while len(lane) >= self.maxsize:
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    LOGGER.warning(f'Ingest queue full ({self.maxsize} {priority} priority events)') # noqa
+                    return False
+                self._cond.wait(remaining)
+
+            lane.append(event)
+            self._size += 1
+            self._cond.notify_all()
+
+        return True
+
+    def get(self) -> dict:
+        """
+        Remove and return the next event, blocking while the queue is empty
+
+        :returns: `dict` of storage event
+        """
+
+        with self._cond:
+            while self._size == 0:
+                self._cond.wait()
+            event = self._lanes[self._next_lane()].popleft()
+            self._size -= 1
+            self._cond.notify_all()
+
+        return event
+
+    def qsize(self) -> int:
+        """
+        Number of queued events
+
+        :returns: `int` of queue size
+        """
+
+        with self._cond:
+            return self._size
+
+    def __repr__(self):
+        return f'<IngestQueue ({self.maxsize})>'
+
+
+class EventBatcher:
+    """Groups storage events of the same dataset into batches"""
+
+    def __init__(self, callback: Callable[..., Any]) -> None:
+        """
+        Event batcher initializer
+
+        :param callback: Python callable called with the `list` of file
+                         paths and the priority of every complete batch
+
+        :returns: `None`
+        """
+
+        self.callback = callback
+        self._batches = {}
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def add(self, key: tuple, filepath: str, window: float = 5,
+            size: int = 100, priority: str = 'normal') -> None:
+        """
+        Add a file to the batch of its key
+
+        :param key: `tuple` identifying files that can be batched together
+        :param filepath: `str` of file path
+        :param window: `float` of seconds to wait for more files
+        :param size: `int` of maximum number of files per batch
+        :param priority: `str` of priority lane of the batch
+
+        :returns: `None`
+        """
+
+        with self._cond:
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = {
+                    'filepaths': [],
+                    'deadline': monotonic() + window,
+                    'priority': priority
+                }
+                self._batches[key] = batch
+                self._cond.notify_all()
+            batch['filepaths'].append(filepath)
+            full = len(batch['filepaths']) >= size
+            if full:
+                self._batches.pop(key)
+
+        if full:
+            self.callback(batch['filepaths'], batch['priority'])
+
+    def _run(self) -> None:
+        """
+        Release batches once their window has elapsed
+
+        :returns: `None`
+        """
+
+        while True:
+            with self._cond:
+                now = monotonic()
+                due = [key for key, batch in self._batches.items()
+                       if batch['deadline'] <= now]
+                batches = [self._batches.pop(key) for key in due]
+                if not batches:
+                    deadline = min((batch['deadline'] for batch in
+                                    self._batches.values()), default=now + 1)
+                    self._cond.wait(deadline - now)
+                    continue
+
+            for batch in batches:
+                self.callback(batch['filepaths'], batch['priority'])
+
+    def __repr__(self):
+        return '<EventBatcher>'
+
+
+class EventCache:
+    """Bounded cache of recently seen storage events"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600) -> None:
+        """
+        Event cache initializer
+
+        :param maxsize: `int` of maximum number of events remembered
+        :param ttl: `float` of seconds an event is remembered
+
+        :returns: `None`
+        """
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.suppressed = 0
+        self._events = OrderedDict()
+
+    def seen(self, key: tuple) -> bool:
+        """
+        Record an event, and check whether it was seen recently
+
+        :param key: `tuple` identifying the event
+
+        :returns: `bool` of whether the event is a duplicate
+        """
+
+        now = monotonic()
+        # drop expired events, oldest first
+        while self._events:
+            oldest, expires = next(iter(self._events.items()))
+            if expires > now:
+                break
+            self._events.pop(oldest)
+
+        if key in self._events:
+            self.suppressed += 1
+            return True
+
+        self._events[key] = now + self.ttl
+        if len(self._events) > self.maxsize:
+            self._events.popitem(last=False)
+
+        return False
+
+    def __repr__(self):
+        return f'<EventCache ({self.maxsize}, {self.ttl})>'
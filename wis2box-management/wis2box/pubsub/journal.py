@@ -0,0 +1,133 @@
+###############################################################################
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+###############################################################################
+
+from datetime import datetime, timezone
+import logging
+from pathlib import Path
+import sqlite3
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+
+class EventJournal:
+    """
+    Write-ahead journal of storage events accepted by the subscriber
+
+    Events are recorded before they are acknowledged to the broker and
+    removed once processed, so that events left over after a restart can
+    be replayed.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Event journal initializer
+
+        :param path: `str` of SQLite database file path
+
+        :returns: `None`
+        """
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'filepath TEXT NOT NULL, '
+            'priority TEXT NOT NULL, '
+            'received TEXT NOT NULL)')
+
+    def add(self, filepath: str, priority: str = 'normal') -> int:
+        """
+        Record an accepted event
+
+        :param filepath: `str` of file path
+        :param priority: `str` of priority lane
+
+        :returns: `int` of journal identifier
+        """
+
+        received = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO events (filepath, priority, received) '
+                'VALUES (?, ?, ?)', (filepath, priority, received))
+
+        return cursor.lastrowid
+
+    def done(self, ids: list) -> None:
+        """
+        Remove processed events
+
+        :param ids: `list` of journal identifiers
+
+        :returns: `None`
+        """
+
+        with self._lock:
+            self._conn.executemany('DELETE FROM events WHERE id = ?',
+                                   [(id_,) for id_ in ids])
+
+    def pending(self) -> list:
+        """
+        List events that were accepted but not processed
+
+        :returns: `list` of `dict` of events, oldest first
+        """
+
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, filepath, priority FROM events ORDER BY id')
+            return [{'id': id_, 'filepath': filepath, 'priority': priority}
+                    for id_, filepath, priority in rows]
+
+    def adopt(self) -> int:
+        """
+        Take over events left in journals of earlier runs, named after
+        this journal with a host name suffix (e.g. `journal-<host>.db`
+        for `journal.db`), and remove those journals
+
+        :returns: `int` of number of events taken over
+        """
+
+        count = 0
+        pattern = f'{self.path.stem}-*{self.path.suffix}'
+        for path in sorted(self.path.parent.glob(pattern)):
+            LOGGER.info(f'Taking over events of journal {path}')
+            journal = EventJournal(path)
+            events = journal.pending()
+            journal._conn.close()
+            for event in events:
+                self.add(event['filepath'], event['priority'])
+            count += len(events)
+            for suffix in ['', '-wal', '-shm']:
+                Path(f'{path}{suffix}').unlink(missing_ok=True)
+
+        return count
+
+    def __repr__(self):
+        return f'<EventJournal ({self.path})>'
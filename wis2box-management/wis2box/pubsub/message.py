@@ -26,6 +26,7 @@ import json
 import hashlib
 import logging
 from pathlib import Path
+from typing import Iterator
 import uuid
 
 from owslib.ogcapi.records import Records
@@ -33,10 +34,16 @@ from owslib.ogcapi.records import Records
 from wis2box import __version__
 from wis2box.util import json_serial
 from wis2box.env import DOCKER_API_URL, STORAGE_PUBLIC, URL, STORAGE_SOURCE
-from wis2box.storage import get_data
+from wis2box.storage import get_data_stream
 
 LOGGER = logging.getLogger(__name__)
 
+# chunk size in bytes for hashing files
+CHUNK_SIZE = 1024 * 1024
+
+# files smaller than this size in bytes are included inline in messages
+INLINE_MAX_SIZE = 3070
+
 
 class SecureHashAlgorithms(Enum):
     SHA512 = 'sha512'
@@ -78,7 +85,9 @@ class PubSubMessage:
     """
 
     def __init__(self, type_: str, identifier: str, filepath: str,
-                 datetime_: datetime, geometry: dict = None) -> None:
+                 datetime_: datetime, geometry: dict = None,
+                 data: bytes = None, checksum: str = None,
+                 length: int = None) -> None:
         """
         Initializer
 
@@ -87,6 +96,10 @@ class PubSubMessage:
         :param filepath: `Path` of file
         :param datetime_: `datetime` object of temporal aspect of data
         :param geometry: `dict` of GeoJSON geometry object
+        :param data: `bytes` of file, if already available
+        :param checksum: `str` of base64-encoded SHA512 digest of file,
+                         if already available
+        :param length: `int` of file size, if already available
 
         :returns: `wis2box.pubsub.message.PubSubMessage` message object
         """
@@ -102,17 +115,44 @@ class PubSubMessage:
             '%Y-%m-%dT%H:%M:%SZ'
         )
         self.checksum_type = SecureHashAlgorithms.SHA512.value
-        # needs to get bytes to calc checksum and get length
-        if isinstance(self.filepath, Path):
+        if checksum is not None and length is not None:
+            self.filebytes = data
+            self.length = length
+            self.checksum_value = checksum
+        elif data is not None:
+            self.filebytes = data
+            self.length = len(self.filebytes)
+            self.checksum_value = self._generate_checksum(
+                self.filebytes, self.checksum_type)
+        elif isinstance(self.filepath, Path):
             with self.filepath.open('rb') as fh:
-                self.filebytes = fh.read()
+                self._hash_chunks(iter(lambda: fh.read(CHUNK_SIZE), b''))
         else:
-            self.filebytes = get_data(filepath)
-        self.length = len(self.filebytes)
-        self.checksum_value = self._generate_checksum(
-            self.filebytes, self.checksum_type)
+            self._hash_chunks(get_data_stream(filepath, CHUNK_SIZE))
         self.message = {}
 
+    def _hash_chunks(self, chunks: Iterator[bytes]) -> None:
+        """
+        Get checksum and length of file from its chunks, without holding
+        it in memory unless small enough to be included inline
+
+        :param chunks: iterator of `bytes` chunks of file
+
+        :returns: `None`
+        """
+
+        sh = getattr(hashlib, self.checksum_type)()
+        self.length = 0
+        content = []
+        for chunk in chunks:
+            sh.update(chunk)
+            self.length += len(chunk)
+            if self.length <= INLINE_MAX_SIZE:
+                content.append(chunk)
+        self.checksum_value = base64.b64encode(sh.digest()).decode()
+        if self.length <= INLINE_MAX_SIZE:
+            self.filebytes = b''.join(content)
+
     def prepare(self):
         """
         Prepare message before dumping
@@ -152,10 +192,12 @@ class WISNotificationMessage(PubSubMessage):
     def __init__(self, identifier: str, metadata_id: str, filepath: str,
                  datetime_: str, geometry=None,
                  wigos_station_identifier=None, gts: dict = None,
-                 operation: str = 'create') -> None:
+                 operation: str = 'create', data: bytes = None,
+                 checksum: str = None, length: int = None) -> None:
 
         super().__init__('wis2-notification-message', identifier,
-                         filepath, datetime_, geometry)
+                         filepath, datetime_, geometry, data, checksum,
+                         length)
 
         data_id = f'{self.identifier}'
 
@@ -214,7 +256,7 @@ class WISNotificationMessage(PubSubMessage):
             self.message['properties']['gts'] = gts
 
         # only bother encoding small files inline
-        if self.length < 3070:
+        if self.length < INLINE_MAX_SIZE and self.filebytes is not None:
             content_value = base64.b64encode(self.filebytes)
             # check length again after encoding
             if len(content_value) < 4096:
@@ -19,14 +19,17 @@
 #
 ###############################################################################
 
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 import logging
-import random
-
+import threading
 from time import sleep
-from typing import Any, Callable
+from typing import Any, Callable, Union
+import uuid
 
 from paho.mqtt import client as mqtt_client
 
+from wis2box.env import BROKER_MAX_INFLIGHT, BROKER_PUBLISH_TIMEOUT
 from wis2box.pubsub.base import BasePubSubClient
 
 LOGGER = logging.getLogger(__name__)
@@ -47,7 +50,16 @@ class MQTTPubSubClient(BasePubSubClient):
         self.test_status = 'unknown'
         self.type = 'mqtt'
         self._port = self.broker_url.port
-        self.client_id = f"wis2box-mqtt-{self.broker['client_type']}-{random.randint(0, 1000)}"  # noqa
+        self.client_id = f"wis2box-mqtt-{self.broker['client_type']}-{uuid.uuid4().hex[:12]}"  # noqa
+        # whether the network loop runs in the background
+        self.started = False
+        # futures of messages awaiting acknowledgement, by message id
+        self._pending = {}
+        # ids of messages acknowledged before their future was registered
+        self._acked = set()
+        # ids of messages given up on, whose acknowledgement is ignored
+        self._abandoned = set()
+        self._lock = threading.Lock()
 
         msg = f'Connecting to broker {self.broker} with id {self.client_id}'
         LOGGER.debug(msg)
@@ -75,6 +87,153 @@ class MQTTPubSubClient(BasePubSubClient):
             self.test_status = e
         LOGGER.debug('Connection initiated')
 
+    def start(self) -> None:
+        """
+        Keep the connection open, running the network loop in a background
+        thread that reconnects when the connection is lost
+
+        :returns: `None`
+        """
+
+        LOGGER.debug(f'Starting network loop of {self.client_id}')
+        self.conn.on_publish = self._on_publish
+        self.conn.on_disconnect = self._on_disconnect
+        self.conn.max_inflight_messages_set(BROKER_MAX_INFLIGHT)
+        self.conn.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.conn.loop_start()
+        self.started = True
+
+    def stop(self) -> None:
+        """
+        Stop the network loop and close the connection
+
+        :returns: `None`
+        """
+
+        LOGGER.debug(f'Stopping network loop of {self.client_id}')
+        self.conn.disconnect()
+        self.conn.loop_stop()
+        self.started = False
+
+    def _on_publish(self, client, userdata, mid) -> None:
+        # the acknowledgement may arrive before publish_async has
+        # registered the future of the message
+        with self._lock:
+            future = self._pending.pop(mid, None)
+            if future is None and mid in self._abandoned:
+                self._abandoned.discard(mid)
+            elif future is None:
+                self._acked.add(mid)
+        if future is not None:
+            future.set_result(True)
+
+    def _on_disconnect(self, client, userdata, rc) -> None:
+        # messages awaiting acknowledgement are resent by the client once
+        # reconnected, but their outcome is unknown to those waiting
+        LOGGER.debug(f'Disconnected from {self.broker}')
+        with self._lock:
+            futures = self._pending
+            self._pending = {}
+            self._abandoned.update(futures)
+            self._acked.clear()
+        if futures:
+            LOGGER.warning(f'{len(futures)} messages not acknowledged before disconnecting') # noqa
+        for future in futures.values():
+            future.set_result(False)
+
+    def _abandon(self, mid: int, future: Future) -> None:
+        """
+        Stop waiting for the acknowledgement of a message
+
+        :param mid: `int` of message id
+        :param future: `Future` of message
+
+        :returns: `None`
+        """
+
+        with self._lock:
+            abandoned = self._pending.get(mid) is future
+            if abandoned:
+                self._pending.pop(mid)
+                self._abandoned.add(mid)
+        if abandoned:
+            future.set_result(False)
+
+    def publish_async(self, topic: str, message: str,
+                      qos: int = 1) -> Future:
+        """
+        Publish a message to a broker/topic without waiting for it to be
+        acknowledged
+
+        Messages are sent by the background network loop (see `start`),
+        with up to WIS2BOX_BROKER_MAX_INFLIGHT QoS 1 messages awaiting
+        acknowledgement at a time.
+
+        :param topic: `str` of topic
+        :param message: `str` of message
+        :param qos: `int` of quality of service
+
+        :returns: `Future` resolving to `bool` of whether the message was
+                  acknowledged (QoS 1) or sent (QoS 0)
+        """
+
+        if not self.started:
+            raise RuntimeError(f'Network loop of {self.client_id} not started') # noqa
+
+        LOGGER.debug(f'Publishing to broker {self.broker}')
+        LOGGER.debug(f'Topic: {topic}')
+        LOGGER.debug(f'Message: {message}')
+
+        future = Future()
+        result = self.conn.publish(topic, message, qos)
+
+        if result.rc == mqtt_client.MQTT_ERR_NO_CONN and qos > 0:
+            # sent once the background network loop has reconnected
+            LOGGER.warning(f'Not connected to broker, queued message to {topic}') # noqa
+        elif result.rc != mqtt_client.MQTT_ERR_SUCCESS:
+            msg = f'Publishing error code: {result.rc}'
+            LOGGER.warning(msg)
+            future.set_result(False)
+            return future
+
+        # do not hold the lock while calling the client, whose network
+        # thread holds its own locks while calling _on_publish
+        future.mid = result.mid
+        with self._lock:
+            # message ids are reused once acknowledged
+            self._abandoned.discard(result.mid)
+            acked = result.mid in self._acked
+            if acked:
+                self._acked.discard(result.mid)
+            else:
+                self._pending[result.mid] = future
+        if acked:
+            future.set_result(True)
+
+        return future
+
+    def publish_batch(self, messages: list, qos: int = 1) -> bool:
+        """
+        Publish several messages, pipelined without waiting for each to be
+        acknowledged, with one confirmation for all of them
+
+        :param messages: `list` of tuples of topic and message
+        :param qos: `int` of quality of service
+
+        :returns: `bool` of whether all messages were acknowledged within
+                  WIS2BOX_BROKER_PUBLISH_TIMEOUT seconds
+        """
+
+        futures = [self.publish_async(topic, message, qos)
+                   for topic, message in messages]
+        _, not_done = wait(futures, timeout=BROKER_PUBLISH_TIMEOUT)
+        if not_done:
+            LOGGER.warning(f'{len(not_done)} of {len(futures)} messages not acknowledged within {BROKER_PUBLISH_TIMEOUT}s') # noqa
+            for future in not_done:
+                self._abandon(future.mid, future)
+
+        return all(future.result() for future in futures)
+
     def pub(self, topic: str, message: str, qos: int = 1) -> bool:
         """
         Publish a message to a broker/topic
@@ -85,6 +244,16 @@ class MQTTPubSubClient(BasePubSubClient):
         :returns: `bool` of publish result
         """
 
+        if self.started:
+            # wait for the acknowledgement
+            future = self.publish_async(topic, message, qos)
+            wait([future], timeout=BROKER_PUBLISH_TIMEOUT)
+            if not future.done():
+                LOGGER.warning(f'Message to {topic} not acknowledged within {BROKER_PUBLISH_TIMEOUT}s') # noqa
+                self._abandon(future.mid, future)
+                return False
+            return future.result()
+
         LOGGER.debug(f'Publishing to broker {self.broker}')
         LOGGER.debug(f'Topic: {topic}')
         LOGGER.debug(f'Message: {message}')
@@ -93,31 +262,30 @@ class MQTTPubSubClient(BasePubSubClient):
         result = self.conn.publish(topic, message, qos)
         self.conn.loop_stop()
 
-        # TODO: investigate implication
-        # result.wait_for_publish()
-
-        if result.is_published:
+        if result.rc == mqtt_client.MQTT_ERR_SUCCESS:
             return True
         else:
-            msg = f'Publishing error code: {result[1]}'
+            msg = f'Publishing error code: {result.rc}'
             LOGGER.warning(msg)
             return False
 
-    def sub(self, topic: str) -> None:
+    def sub(self, topic: Union[str, list]) -> None:
         """
         Subscribe to a broker/topic
 
-        :param topic: `str` of topic
+        :param topic: `str` of topic, or `list` of topics
 
         :returns: `None`
         """
 
+        topics = [topic] if isinstance(topic, str) else topic
+
         def on_connect(client, userdata, flags, rc):
             if rc == 0:
                 LOGGER.debug(f'Connected to broker {self.broker}')
-                LOGGER.debug(f'Subscribing to topic {topic} ')
-                client.subscribe(topic, qos=1)
-                LOGGER.debug(f'Subscribed to topic {topic}')
+                LOGGER.debug(f'Subscribing to topics {topics} ')
+                client.subscribe([(topic_, 1) for topic_ in topics])
+                LOGGER.debug(f'Subscribed to topics {topics}')
             else:
                 msg = 'Failed to connect to MQTT-broker:'
                 LOGGER.error(f'{msg} {mqtt_client.connack_string(rc)}')
@@ -125,11 +293,93 @@ class MQTTPubSubClient(BasePubSubClient):
         def on_disconnect(client, userdata, rc):
             LOGGER.debug(f'Disconnected from {self.broker}')
 
-        LOGGER.debug(f'Subscribing to broker {self.broker}, topic {topic}')
+        LOGGER.debug(f'Subscribing to broker {self.broker}, topics {topics}')
         self.conn.on_connect = on_connect
         self.conn.on_disconnect = on_disconnect
         self.conn.loop_forever()
 
+    async def sub_async(self, topic: Union[str, list]) -> None:
+        """
+        Subscribe to a broker/topic, driving the client from the running
+        asyncio event loop instead of a blocking network loop
+
+        :param topic: `str` of topic, or `list` of topics
+
+        :returns: `None`
+        """
+
+        loop = asyncio.get_running_loop()
+        topics = [topic] if isinstance(topic, str) else topic
+
+        def on_connect(client, userdata, flags, rc):
+            if rc == 0:
+                LOGGER.debug(f'Connected to broker {self.broker}')
+                client.subscribe([(topic_, 1) for topic_ in topics])
+                LOGGER.debug(f'Subscribed to topics {topics}')
+            else:
+                msg = 'Failed to connect to MQTT-broker:'
+                LOGGER.error(f'{msg} {mqtt_client.connack_string(rc)}')
+
+        def on_disconnect(client, userdata, rc):
+            LOGGER.debug(f'Disconnected from {self.broker}')
+
+        # message callbacks may block (storage, wis2box-api, journal), so
+        # they run one at a time, in order, off the event loop; messages
+        # are thus acknowledged once received
+        executor = ThreadPoolExecutor(max_workers=1)
+        on_message = self.conn.on_message
+
+        def on_message_done(future):
+            if future.exception() is not None:
+                LOGGER.error(f'Message callback failed: {future.exception()}') # noqa
+
+        def on_message_(client, userdata, message):
+            loop.run_in_executor(executor, on_message, client, userdata,
+                                 message).add_done_callback(on_message_done)
+
+        def on_socket_open(client, userdata, sock):
+            loop.add_reader(sock, client.loop_read)
+
+        def on_socket_close(client, userdata, sock):
+            loop.remove_reader(sock)
+
+        def on_socket_register_write(client, userdata, sock):
+            loop.add_writer(sock, client.loop_write)
+
+        def on_socket_unregister_write(client, userdata, sock):
+            loop.remove_writer(sock)
+
+        LOGGER.debug(f'Subscribing to broker {self.broker}, topics {topics}')
+        self.conn.on_connect = on_connect
+        self.conn.on_disconnect = on_disconnect
+        if on_message is not None:
+            self.conn.on_message = on_message_
+        self.conn.on_socket_open = on_socket_open
+        self.conn.on_socket_close = on_socket_close
+        self.conn.on_socket_register_write = on_socket_register_write
+        self.conn.on_socket_unregister_write = on_socket_unregister_write
+
+        # the connection was opened before the callbacks were set
+        sock = self.conn.socket()
+        if sock is not None:
+            on_socket_open(self.conn, None, sock)
+            if self.conn.want_write():
+                on_socket_register_write(self.conn, None, sock)
+
+        delay = 1
+        while True:
+            # handle keepalive and retries, reconnecting when needed
+            if self.conn.loop_misc() == mqtt_client.MQTT_ERR_NO_CONN:
+                try:
+                    self.conn.reconnect()
+                    delay = 1
+                except Exception as err:
+                    LOGGER.error(f'MQTT Broker reconnect error: {err}')
+                    delay = min(delay * 2, 60)
+                    await asyncio.sleep(delay)
+                    continue
+            await asyncio.sleep(1)
+
     def bind(self, event: str, function: Callable[..., Any]) -> None:
         """
         Binds an event to a function
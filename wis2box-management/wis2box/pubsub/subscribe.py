@@ -19,11 +19,15 @@
 #
 ###############################################################################
 
+import asyncio
 import base64
+from collections import deque
+from copy import deepcopy
 import json
 import logging
-import multiprocessing as mp
-
+import signal
+import sys
+import threading
 from time import sleep
 
 import click
@@ -31,43 +35,48 @@ import click
 from wis2box import cli_helpers
 import wis2box.data as data_
 
-from wis2box.api import (setup_collection, upsert_collection_item,
-                         delete_collection_item, remove_collection)
+from wis2box.api import (BulkIndexer, setup_collection,
+                         delete_collection_item, invalidate_result_cache,
+                         remove_collection)
 
-from wis2box.data_mappings import get_data_mappings, get_plugins
+from wis2box.data_mappings import (DataMappings, get_data_mapping,
+                                   get_data_mappings, get_plugins,
+                                   get_gts_headers, get_gts_mappings,
+                                   match_dataset, preload_plugins,
+                                   refresh_data_mappings,
+                                   refresh_gts_mappings)
 from wis2box.data.message import MessageData
 
-from wis2box.env import (DATADIR, DOCKER_BROKER,
-                         STORAGE_SOURCE, STORAGE_INCOMING)
+from wis2box.env import (DOCKER_BROKER,
+                         STORAGE_SOURCE, STORAGE_INCOMING,
+                         SUBSCRIBER_WORKERS, SUBSCRIBER_WORKER_MAX_TASKS,
+                         SUBSCRIBER_WORKER_MAX_MEMORY, SUBSCRIBER_QUEUE_SIZE,
+                         SUBSCRIBER_QUEUE_TIMEOUT, SUBSCRIBER_INFLIGHT,
+                         SUBSCRIBER_ENGINE, SUBSCRIBER_ASYNC_CONCURRENCY,
+                         SUBSCRIBER_SHARE_GROUP, SUBSCRIBER_JOURNAL,
+                         SUBSCRIBER_DEDUP_SIZE, SUBSCRIBER_DEDUP_TTL,
+                         SUBSCRIBER_MESSAGES_BATCH_SIZE,
+                         SUBSCRIBER_MESSAGES_INTERVAL)
 from wis2box.handler import Handler, NotHandledError
 import wis2box.metadata.discovery as discovery_metadata
 from wis2box.plugin import load_plugin, PLUGINS
+from wis2box.publisher import load_publisher
+from wis2box.pubsub.ingest import EventBatcher, EventCache, IngestQueue
+from wis2box.pubsub.journal import EventJournal
 from wis2box.pubsub.message import gcm
 from wis2box.storage import put_data
+from wis2box.worker import ThreadWorkerPool, WorkerPool
 
 LOGGER = logging.getLogger(__name__)
 
-
-def get_gts_mappings():
-    # read gts mappings from CSV file in DATADIR
-    gts_mappings = {}
-    mapping_file = 'gts_headers_mapping.csv'
-    try:
-        with open(f'{DATADIR}/{mapping_file}', 'r') as f:
-            for line in f:
-                key = line.strip().split(',')[0]
-                if key == 'string_in_filepath':
-                    continue
-                ttaaii = line.strip().split(',')[1]
-                cccc = line.strip().split(',')[2]
-                value = {'ttaaii': ttaaii, 'cccc': cccc}
-                gts_mappings[key] = value
-                LOGGER.info(f'GTS mapping: string_in_filepath={key}, {value}')
-    except FileNotFoundError:
-        LOGGER.warning(f'To add GTS headers, please create {mapping_file} in WIS2BOX_HOST_DATADIR') # noqa
-    except Exception as err:
-        LOGGER.error(f'Error reading GTS mappings: {err}')
-    return gts_mappings
+# topics handled by a single subscriber of a share group
+SHARED_TOPICS = [
+    'wis2box/storage',
+    'wis2box/notifications',
+    'wis2box/cap/publication',
+    'wis2box/data/publication',
+    'wis2box/dataset/#'
+]
 
 
 class WIS2BoxSubscriber:
@@ -75,17 +84,388 @@ class WIS2BoxSubscriber:
     def __init__(self, broker):
         self.data_mappings = get_data_mappings()
         self.gts_mappings = get_gts_mappings()
+        # import data plugins once, before forking the workers
+        preload_plugins(self.data_mappings)
+        if SUBSCRIBER_ENGINE == 'asyncio':
+            self.pool = ThreadWorkerPool(target=self.handle,
+                                         size=SUBSCRIBER_ASYNC_CONCURRENCY,
+                                         callback=self.on_task_done)
+        else:
+            self.pool = WorkerPool(target=self.handle,
+                                   size=SUBSCRIBER_WORKERS,
+                                   max_tasks=SUBSCRIBER_WORKER_MAX_TASKS,
+                                   max_memory=SUBSCRIBER_WORKER_MAX_MEMORY,
+                                   callback=self.on_task_done)
+        self.pool.start()
+        # storage events are queued by the MQTT callback and dispatched
+        # to the workers from a separate thread
+        self.queue = IngestQueue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.inflight = threading.BoundedSemaphore(SUBSCRIBER_INFLIGHT)
+        self.batcher = EventBatcher(callback=self.enqueue_batch)
+        # journaled events rejected by a full queue, queued again once
+        # their lane has room
+        self.deferred = deque()
+        # repeated events for the same object version are dropped
+        self.events = None
+        if SUBSCRIBER_DEDUP_TTL > 0:
+            self.events = EventCache(maxsize=SUBSCRIBER_DEDUP_SIZE,
+                                     ttl=SUBSCRIBER_DEDUP_TTL)
+        # accepted events are journaled until processed, events left over
+        # from a previous run are processed before subscribing
+        self.journal = None
+        if SUBSCRIBER_JOURNAL:
+            self.journal = EventJournal(SUBSCRIBER_JOURNAL)
+            if not SUBSCRIBER_SHARE_GROUP:
+                # journals of earlier runs named after their container
+                self.journal.adopt()
+        # notifications are indexed in bulk
+        self.indexer = BulkIndexer('messages',
+                                   size=SUBSCRIBER_MESSAGES_BATCH_SIZE,
+                                   interval=SUBSCRIBER_MESSAGES_INTERVAL)
+        threading.Thread(target=self.dispatch, daemon=True).start()
+        self.replay()
+        threading.Thread(target=self.requeue, daemon=True).start()
         self.broker = broker
         self.broker.bind('on_message', self.on_message_handler)
-        self.broker.sub('wis2box/#')
+        try:
+            if SUBSCRIBER_ENGINE == 'asyncio':
+                asyncio.run(self.broker.sub_async(self.get_topics()))
+            else:
+                self.broker.sub(self.get_topics())
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """
+        Index buffered notifications and stop the workers
+
+        :returns: `None`
+        """
+
+        LOGGER.info('Stopping wis2box subscriber')
+        self.indexer.stop()
+        self.pool.stop()
+
+    def get_topics(self) -> list:
+        """
+        Get topics to subscribe to
+
+        When a share group is set, data and publication topics are shared
+        between the subscribers of the group, so that each message is
+        handled by one of them, while data mappings refreshes still reach
+        every subscriber, as do station updates.
+
+        :returns: `list` of topics
+        """
+
+        if not SUBSCRIBER_SHARE_GROUP:
+            return ['wis2box/#']
+
+        LOGGER.info(f'Joining share group {SUBSCRIBER_SHARE_GROUP}')
+        topics = [f'$share/{SUBSCRIBER_SHARE_GROUP}/{topic}'
+                  for topic in SHARED_TOPICS]
+        topics.append('wis2box/data_mappings/refresh')
+        topics.append('wis2box/stations')
+
+        return topics
+
+    def update_data_mappings(self, metadata_id: str,
+                             value: dict = None) -> None:
+        """
+        Update the data mappings of one dataset after a dataset change, on
+        every subscriber of the share group if any
+
+        :param metadata_id: `str` of metadata identifier
+        :param value: `dict` of data mappings of the dataset, or `None`
+                      if the dataset was removed
+
+        :returns: `None`
+        """
+
+        if SUBSCRIBER_SHARE_GROUP:
+            refresh_data_mappings({
+                'metadata_id': metadata_id,
+                'data_mappings': value,
+                'version': self.data_mappings.version + 1
+            })
+        else:
+            self.set_data_mappings(
+                self.data_mappings.patch(metadata_id, value))
+
+    def refresh_data_mappings(self, message: dict) -> None:
+        """
+        Refresh data mappings on request, applying the requested change
+        if it follows the current version, else reloading all data
+        mappings
+
+        :param message: `dict` of refresh request
+
+        :returns: `None`
+        """
+
+        version = message.get('version')
+        if version == self.data_mappings.version + 1:
+            LOGGER.info(f'Updating data mappings of {message["metadata_id"]}') # noqa
+            self.set_data_mappings(self.data_mappings.patch(
+                message['metadata_id'], message['data_mappings']))
+            return
+
+        if version is not None:
+            LOGGER.info(f'Data mappings version {self.data_mappings.version} behind {version}, reloading') # noqa
+        data_mappings = get_data_mappings()
+        data_mappings.version = max(version or 0,
+                                    self.data_mappings.version + 1)
+        self.set_data_mappings(data_mappings)
+
+    def set_data_mappings(self, data_mappings: DataMappings) -> None:
+        """
+        Set data mappings used for new tasks
+
+        :param data_mappings: `DataMappings` of data mappings
+
+        :returns: `None`
+        """
+
+        self.data_mappings = data_mappings
+        preload_plugins(self.data_mappings)
+
+    def is_duplicate(self, message: dict) -> bool:
+        """
+        Check whether a storage event was already received for the same
+        object version, i.e. the same bucket, key and ETag
+
+        :param message: `dict` of storage event
+
+        :returns: `bool` of whether the event is a duplicate
+        """
+
+        if self.events is None:
+            return False
 
-    def handle(self, filepath):
         try:
-            LOGGER.info(f'Processing {filepath}')
+            s3 = message['Records'][0]['s3']
+            key = (s3['bucket']['name'], s3['object']['key'],
+                   s3['object']['eTag'])
+        except (KeyError, IndexError, TypeError):
+            return False
+
+        if not self.events.seen(key):
+            return False
+
+        LOGGER.info(f'Duplicate storage event: {message["Key"]}, skipping')
+        self.publish_duplicate_message(message)
+
+        return True
+
+    def publish_duplicate_message(self, message: dict) -> None:
+        """
+        Publish a suppressed storage event for monitoring
+
+        :param message: `dict` of storage event
+
+        :returns: `None`
+        """
+
+        duplicate = {
+            'Key': message['Key'],
+            'EventName': message.get('EventName'),
+            'suppressed': self.events.suppressed
+        }
+
+        def on_done(future):
+            if not future.result():
+                LOGGER.error('Failed to publish duplicate message on internal broker') # noqa
+
+        # publish with qos=0, without blocking the MQTT callback
+        local_broker = load_publisher(DOCKER_BROKER)
+        local_broker.publish_async('wis2box/storage/duplicate', json.dumps(duplicate), qos=0).add_done_callback(on_done) # noqa
+
+    def replay(self) -> None:
+        """
+        Queue events of the journal that were not processed
+
+        :returns: `None`
+        """
+
+        if self.journal is None:
+            return
+
+        events = self.journal.pending()
+        if events:
+            LOGGER.info(f'Replaying {len(events)} unprocessed events')
+        for event in events:
+            self.queue.put({'filepaths': [event['filepath']],
+                            'ids': [event['id']]},
+                           priority=event['priority'])
+
+    def enqueue(self, filepath: str) -> None:
+        """
+        Queue a file for processing, batching it with other files of the
+        same dataset if the data mappings define a batch window
+
+        :param filepath: `str` of file path
+
+        :returns: `None`
+        """
+
+        try:
+            metadata_id, _ = match_dataset(filepath, self.data_mappings)
+            options = self.data_mappings[metadata_id]
+        except ValueError:
+            # unmatched files are reported by the handler
+            metadata_id = None
+            options = {}
+
+        priority = options.get('priority', 'normal')
+        event = filepath
+        if self.journal is not None:
+            event = (filepath, self.journal.add(filepath, priority))
+        batch = options.get('batch')
+        if batch:
+            # files in a batch share plugins, including GTS headers
+            gts_headers = get_gts_headers(filepath, self.gts_mappings) or {}
+            key = (metadata_id, filepath.split('.')[-1],
+                   gts_headers.get('ttaaii'), gts_headers.get('cccc'))
+            self.batcher.add(key, event,
+                             window=batch.get('window', 5),
+                             size=batch.get('size', 100),
+                             priority=priority)
+        else:
+            self.enqueue_batch([event], priority)
+
+    def enqueue_batch(self, events: list, priority: str) -> None:
+        """
+        Queue files to be processed together by one worker
+
+        :param events: `list` of file paths, or of tuples of file path
+                       and journal identifier
+        :param priority: `str` of priority lane
+
+        :returns: `None`
+        """
+
+        filepaths = []
+        ids = []
+        for event in events:
+            if isinstance(event, tuple):
+                filepath, id_ = event
+                ids.append(id_)
+            else:
+                filepath = event
+            filepaths.append(filepath)
+
+        # the message is acknowledged once the MQTT callback returns, i.e.
+        # once the event is journaled and queued; a full queue holds back
+        # the ack briefly, then the event is deferred.  With the asyncio
+        # engine the message was acknowledged on receipt, so waiting would
+        # only hold up the following messages
+        timeout = SUBSCRIBER_QUEUE_TIMEOUT
+        if SUBSCRIBER_ENGINE == 'asyncio':
+            timeout = 0
+        if self.queue.put({'filepaths': filepaths, 'ids': ids},
+                          timeout=timeout, priority=priority):
+            return
+
+        if ids:
+            # acknowledged, but kept in the journal
+            LOGGER.warning(f'Ingest queue full, deferring {filepaths}')
+            self.deferred.append(({'filepaths': filepaths, 'ids': ids},
+                                  priority))
+            return
+
+        # without a journal, the event is lost
+        LOGGER.error(f'Ingest queue full, {filepaths} rejected')
+        message = {
+            'filepaths': filepaths,
+            'description': 'Ingest queue full'
+        }
+        local_broker = load_publisher(DOCKER_BROKER)
+        # publish with qos=0
+        success = local_broker.pub('wis2box/handler', json.dumps(message), qos=0) # noqa
+        if not success:
+            LOGGER.error('Failed to publish rejection message on internal broker') # noqa
+
+    def requeue(self, interval: float = 1) -> None:
+        """
+        Queue deferred events again, oldest first, once their lane has room
+
+        :param interval: `float` of seconds between attempts
+
+        :returns: `None`
+        """
+
+        while True:
+            sleep(interval)
+            full = set()
+            # every deferred event is rotated once, keeping their order
+            for _ in range(len(self.deferred)):
+                event, priority = self.deferred.popleft()
+                if (priority in full or
+                        not self.queue.put(event, timeout=0,
+                                           priority=priority)):
+                    full.add(priority)
+                    self.deferred.append((event, priority))
+
+    def dispatch(self) -> None:
+        """
+        Dispatch queued storage events to the workers, keeping at most
+        SUBSCRIBER_INFLIGHT events in progress
+
+        :returns: `None`
+        """
+
+        while True:
+            event = self.queue.get()
+            self.inflight.acquire()
+            try:
+                # GTS mappings follow changes of the mappings file
+                self.gts_mappings = refresh_gts_mappings(self.gts_mappings)
+            except Exception as err:
+                LOGGER.error(f'Failed to refresh GTS mappings: {err}')
+            try:
+                self.pool.submit(event, self.data_mappings,
+                                 self.gts_mappings)
+            except Exception as err:
+                # journaled events are replayed at the next start
+                msg = f'Failed to dispatch {event["filepaths"]}: {err}'
+                if event['ids']:
+                    msg += ' (kept in journal)'
+                LOGGER.error(msg, exc_info=True)
+                self.inflight.release()
+
+    def on_task_done(self, task_id, args, success) -> None:
+        """
+        Release the inflight slot of a finished task and remove its
+        events from the journal
+
+        :param task_id: `int` of task identifier
+        :param args: `tuple` of task arguments
+        :param success: `bool` of task result
+
+        :returns: `None`
+        """
+
+        event = args[0]
+        LOGGER.debug(f'Done processing {event["filepaths"]} (success={success})') # noqa
+        # failed events are reported by the handler and not retried
+        if self.journal is not None and event['ids']:
+            self.journal.done(event['ids'])
+        self.inflight.release()
+
+    def handle(self, event, data_mappings=None, gts_mappings=None):
+        # workers receive the current mappings with every task
+        filepaths = event['filepaths']
+        if data_mappings is None:
+            data_mappings = self.data_mappings
+        if gts_mappings is None:
+            gts_mappings = self.gts_mappings
+        try:
+            LOGGER.info(f'Processing {filepaths}')
             # load handler
-            handler = Handler(filepath=filepath,
-                              data_mappings=self.data_mappings,
-                              gts_mappings=self.gts_mappings)
+            handler = Handler(filepath=filepaths[0],
+                              data_mappings=data_mappings,
+                              gts_mappings=gts_mappings,
+                              batch=filepaths[1:])
             if handler.handle():
                 LOGGER.debug('Data processed')
                 for plugin in handler.plugins:
@@ -145,7 +525,7 @@ class WIS2BoxSubscriber:
         if topic == 'wis2box/notifications':
             LOGGER.info(f'Notification: {message}')
             # store notification in messages collection
-            upsert_collection_item('messages', message)
+            self.indexer.add(message)
         elif (topic == 'wis2box/storage' and
               message.get('EventName', '') in ['s3:ObjectCreated:Put', 's3:ObjectCreated:CompleteMultipartUpload']): # noqa
             LOGGER.debug('Storing data')
@@ -154,11 +534,10 @@ class WIS2BoxSubscriber:
             if key.endswith('/'):
                 LOGGER.info(f'Do not process directories: {key}')
                 return
+            if self.is_duplicate(message):
+                return
             filepath = f'{STORAGE_SOURCE}/{key}'
-            # start a new process to handle the received data
-            while len(mp.active_children()) == mp.cpu_count():
-                sleep(0.05)
-            mp.Process(target=self.handle, args=(filepath,)).start()
+            self.enqueue(filepath)
         elif topic == 'wis2box/cap/publication':
             LOGGER.debug('Publishing data received by cap-editor')
             # get filename and data from message and store in incoming-data
@@ -182,15 +561,21 @@ class WIS2BoxSubscriber:
         elif topic == 'wis2box/data/publication':
             LOGGER.debug('Publishing data')
             self.handle_publish(message)
+        elif topic == 'wis2box/stations':
+            # conversion results depend on station metadata
+            LOGGER.info('Stations updated, invalidating cached results')
+            invalidate_result_cache()
         elif topic == 'wis2box/data_mappings/refresh':
             LOGGER.info('Refreshing data mappings')
-            self.data_mappings = get_data_mappings()
+            self.refresh_data_mappings(message)
             LOGGER.info(f'Data mappings: {self.data_mappings}')
         elif topic == 'wis2box/dataset/publication':
             LOGGER.debug('Publishing dataset')
-            metadata = message
+            # publishing strips the wis2box section from the record, which
+            # is needed afterwards for the data mappings
+            metadata = deepcopy(message)
             try:
-                discovery_metadata.publish_discovery_metadata(metadata)
+                discovery_metadata.publish_discovery_metadata(message)
             except Exception as err:
                 LOGGER.error(f'Failed to publish discovery metadata: {err}')
                 return
@@ -200,7 +585,15 @@ class WIS2BoxSubscriber:
                     data_.add_collection_data(metadata)
                 except Exception as err:
                     click.echo(f'ERROR adding data-collection for: {metadata["id"]}: {err}') # noqa
-            self.data_mappings = get_data_mappings()
+            data_mapping = get_data_mapping(metadata)
+            if data_mapping is None:
+                LOGGER.warning(f'No data mappings for {metadata["id"]}, keeping current data mappings') # noqa
+                return
+            self.update_data_mappings(metadata['id'], data_mapping)
+            # with a share group, the change is applied on refresh
+            if (not SUBSCRIBER_SHARE_GROUP and
+                    metadata['id'] not in self.data_mappings):
+                LOGGER.error(f'Dataset {metadata["id"]} missing from data mappings after publication') # noqa
         elif topic.startswith('wis2box/dataset/unpublication'):
             LOGGER.debug('Unpublishing dataset')
             identifier = topic.split('/')[-1]
@@ -209,7 +602,7 @@ class WIS2BoxSubscriber:
             if message.get('force', False):
                 LOGGER.info('Deleting data')
                 remove_collection(identifier)
-            self.data_mappings = get_data_mappings()
+            self.update_data_mappings(identifier)
         else:
             LOGGER.debug('Ignoring message')
 
@@ -230,6 +623,9 @@ def subscribe(ctx, verbosity):
 
     broker = load_plugin('pubsub', defs)
 
+    # stop gracefully when the container is stopped
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     # start the wis2box subscriber
     click.echo('Starting wis2box subscriber')
     WIS2BoxSubscriber(broker=broker)
@@ -20,14 +20,49 @@
 ###############################################################################
 
 import logging
-from typing import Any
+import mmap
+import os
+import tempfile
+from typing import Any, Iterator, Union
 
 from wis2box.env import (STORAGE_TYPE, STORAGE_SOURCE,
                          STORAGE_USERNAME, STORAGE_PASSWORD)
 from wis2box.plugin import load_plugin, PLUGINS
+from wis2box.util import fork_safe_lock
 
 LOGGER = logging.getLogger(__name__)
 
+# storage clients are reused within a process
+_STORAGES = {}
+_STORAGES_LOCK = fork_safe_lock()
+
+
+def load_storage(name: str) -> Any:
+    """
+    Load storage plugin for a bucket, reusing the client within a process
+
+    :param name: name of bucket
+
+    :returns: plugin object
+    """
+
+    key = (os.getpid(), name)
+    with _STORAGES_LOCK:
+        if key not in _STORAGES:
+            defs = {
+                'storage_type': STORAGE_TYPE,
+                'source': STORAGE_SOURCE,
+                'name': name,
+                'auth': {'username': STORAGE_USERNAME,
+                         'password': STORAGE_PASSWORD},
+                'codepath': PLUGINS['storage'][STORAGE_TYPE]['plugin']
+            }
+
+            LOGGER.debug(f'Connecting to storage: {name}')
+            _STORAGES[key] = load_plugin('storage', defs)
+
+    return _STORAGES[key]
+
 
 def exists(path: str) -> bool:
     """
@@ -41,16 +76,7 @@ def exists(path: str) -> bool:
     storage_path = path.replace(f'{STORAGE_SOURCE}/', '')
     name = storage_path.split('/')[0]
 
-    defs = {
-        'storage_type': STORAGE_TYPE,
-        'source': STORAGE_SOURCE,
-        'name': name,
-        'auth': {'username': STORAGE_USERNAME, 'password': STORAGE_PASSWORD},
-        'codepath': PLUGINS['storage'][STORAGE_TYPE]['plugin']
-    }
-
-    LOGGER.debug(f'Connecting to storage: {name}')
-    storage = load_plugin('storage', defs)
+    storage = load_storage(name)
 
     identifier = storage_path.replace(name, '')
 
@@ -70,16 +96,7 @@ def get_data(path: str) -> Any:
     storage_path = path.replace(f'{STORAGE_SOURCE}/', '')
     name = storage_path.split('/')[0]
 
-    defs = {
-        'storage_type': STORAGE_TYPE,
-        'source': STORAGE_SOURCE,
-        'name': name,
-        'auth': {'username': STORAGE_USERNAME, 'password': STORAGE_PASSWORD},
-        'codepath': PLUGINS['storage'][STORAGE_TYPE]['plugin']
-    }
-
-    LOGGER.debug(f'Connecting to storage: {name}')
-    storage = load_plugin('storage', defs)
+    storage = load_storage(name)
 
     # remove name and leading /
     identifier = storage_path.replace(name, '').lstrip('/')
@@ -88,6 +105,108 @@ def get_data(path: str) -> Any:
     return storage.get(identifier)
 
 
+def get_data_stream(path: str,
+                    chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """
+    Get data from storage in chunks, without holding it in memory
+
+    :param path: path of object/file
+    :param chunk_size: `int` of chunk size in bytes
+
+    :returns: iterator of `bytes` chunks of object/file
+    """
+
+    LOGGER.debug(f'get_data_stream from : {path}')
+    storage_path = path.replace(f'{STORAGE_SOURCE}/', '')
+    name = storage_path.split('/')[0]
+
+    storage = load_storage(name)
+
+    # remove name and leading /
+    identifier = storage_path.replace(name, '').lstrip('/')
+
+    return storage.get_stream(identifier, chunk_size)
+
+
+def get_data_buffer(path: str,
+                    spool_size: int = 16 * 1024 * 1024
+                    ) -> Union[bytes, memoryview]:
+    """
+    Get data from storage as a read-only buffer, that can be shared
+    without copies
+
+    Objects larger than spool_size are spooled to a temporary file and
+    memory-mapped instead of being held in memory.
+
+    :param path: path of object/file
+    :param spool_size: `int` of maximum size in bytes held in memory
+
+    :returns: `bytes` or read-only `memoryview` of object/file
+    """
+
+    LOGGER.debug(f'get_data_buffer from : {path}')
+
+    chunks = []
+    size = 0
+    spool = None
+    for chunk in get_data_stream(path):
+        if spool is not None:
+            spool.write(chunk)
+            continue
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > spool_size:
+            LOGGER.debug(f'Spooling {path} to temporary file')
+            spool = tempfile.TemporaryFile()
+            spool.writelines(chunks)
+            chunks = None
+
+    if spool is None:
+        return b''.join(chunks)
+
+    with spool:
+        spool.flush()
+        buffer = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return memoryview(buffer)
+
+
+class DataURL(str):
+    """
+    URL of data in storage, passed on in place of the data itself
+
+    The `digest` attribute identifies the referenced data, if known.
+    """
+
+    digest = None
+
+
+def get_data_url(path: str, expires: int = 3600) -> DataURL:
+    """
+    Get a presigned URL of data in storage, that can be fetched without
+    credentials
+
+    :param path: path of object/file
+    :param expires: `int` of validity of URL in seconds
+
+    :returns: `DataURL` of object/file
+    """
+
+    LOGGER.debug(f'get_data_url for : {path}')
+    storage_path = path.replace(f'{STORAGE_SOURCE}/', '')
+    name = storage_path.split('/')[0]
+
+    storage = load_storage(name)
+
+    # remove name and leading /
+    identifier = storage_path.replace(name, '').lstrip('/')
+
+    data_url = DataURL(storage.get_url(identifier, expires))
+    data_url.digest = storage.get_etag(identifier)
+
+    return data_url
+
+
 def list_content(basepath: str) -> Any:
     """
     List storage paths starting
@@ -100,16 +219,7 @@ def list_content(basepath: str) -> Any:
     storage_path = basepath.replace(f'{STORAGE_SOURCE}/', '')
     name = storage_path.split('/')[0]
 
-    defs = {
-        'storage_type': STORAGE_TYPE,
-        'source': STORAGE_SOURCE,
-        'name': name,
-        'auth': {'username': STORAGE_USERNAME, 'password': STORAGE_PASSWORD},
-        'codepath': PLUGINS['storage'][STORAGE_TYPE]['plugin']
-    }
-
-    LOGGER.debug(f'Connecting to storage: {name}')
-    storage = load_plugin('storage', defs)
+    storage = load_storage(name)
 
     prefix = storage_path.replace(name, '')
 
@@ -117,14 +227,37 @@ def list_content(basepath: str) -> Any:
     return storage.list_objects(prefix)
 
 
+def get_metadata(path: str) -> Union[dict, None]:
+    """
+    Get user metadata of data in storage, without fetching the data
+
+    :param path: path of object/file
+
+    :returns: `dict` of metadata, or `None` if object/file does not exist
+    """
+
+    LOGGER.debug(f'get_metadata of : {path}')
+    storage_path = path.replace(f'{STORAGE_SOURCE}/', '')
+    name = storage_path.split('/')[0]
+
+    storage = load_storage(name)
+
+    # remove name and leading /
+    identifier = storage_path.replace(name, '').lstrip('/')
+
+    return storage.get_metadata(identifier)
+
+
 def put_data(data: bytes, path: str,
-             content_type: str = 'application/octet-stream') -> Any:
+             content_type: str = 'application/octet-stream',
+             metadata: dict = None) -> Any:
     """
     Put data into storage
 
     :param data: bytes of object/file
     :param path: path to use object id
     :param content_type: media type (default is `application/octet-stream`)
+    :param metadata: `dict` of user metadata to store with object/file
 
     :returns: content of object/file
     """
@@ -132,21 +265,12 @@ def put_data(data: bytes, path: str,
     storage_path = path.replace(f'{STORAGE_SOURCE}/', '')
     name = storage_path.split('/')[0]
 
-    defs = {
-        'storage_type': STORAGE_TYPE,
-        'source': STORAGE_SOURCE,
-        'name': name,
-        'auth': {'username': STORAGE_USERNAME, 'password': STORAGE_PASSWORD},
-        'codepath': PLUGINS['storage'][STORAGE_TYPE]['plugin']
-    }
-
-    LOGGER.debug(f'Connecting to storage: {name}')
-    storage = load_plugin('storage', defs)
+    storage = load_storage(name)
 
     identifier = storage_path.replace(name, '').lstrip('/')
 
     LOGGER.debug(f'Storing data into {identifier}')
-    return storage.put(data, identifier, content_type)
+    return storage.put(data, identifier, content_type, metadata)
 
 
 def delete_data(path: str) -> Any:
@@ -161,16 +285,7 @@ def delete_data(path: str) -> Any:
     storage_path = path.replace(f'{STORAGE_SOURCE}/', '')
     name = storage_path.split('/')[0]
 
-    defs = {
-        'storage_type': STORAGE_TYPE,
-        'source': STORAGE_SOURCE,
-        'name': name,
-        'auth': {'username': STORAGE_USERNAME, 'password': STORAGE_PASSWORD},
-        'codepath': PLUGINS['storage'][STORAGE_TYPE]['plugin']
-    }
-
-    LOGGER.debug(f'Connecting to storage: {name}')
-    storage = load_plugin('storage', defs)
+    storage = load_storage(name)
 
     identifier = storage_path.replace(name, '')
 
@@ -190,16 +305,7 @@ def move_data(old_path: str, path: str) -> Any:
     storage_path = path.replace(f'{STORAGE_SOURCE}/', '')
     name = storage_path.split('/')[0]
 
-    defs = {
-        'storage_type': STORAGE_TYPE,
-        'source': STORAGE_SOURCE,
-        'name': name,
-        'auth': {'username': STORAGE_USERNAME, 'password': STORAGE_PASSWORD},
-        'codepath': PLUGINS['storage'][STORAGE_TYPE]['plugin']
-    }
-
-    LOGGER.debug(f'Connecting to storage: {name}')
-    storage = load_plugin('storage', defs)
+    storage = load_storage(name)
 
     identifier = storage_path.replace(name, '')
 
@@ -21,7 +21,7 @@
 
 from enum import Enum
 import logging
-from typing import Any
+from typing import Any, Iterator, Union
 
 LOGGER = logging.getLogger(__name__)
 
@@ -73,14 +73,63 @@ class StorageBase:
 
         raise NotImplementedError()
 
+    def get_stream(self, identifier: str,
+                   chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """
+        Access data source from storage in chunks
+
+        :param identifier: `str` of data source identifier
+        :param chunk_size: `int` of chunk size in bytes
+
+        :returns: iterator of `bytes` chunks
+        """
+
+        raise NotImplementedError()
+
+    def get_url(self, identifier: str, expires: int = 3600) -> str:
+        """
+        Get a presigned URL to access data source without credentials
+
+        :param identifier: `str` of data source identifier
+        :param expires: `int` of validity of URL in seconds
+
+        :returns: `str` of URL
+        """
+
+        raise NotImplementedError()
+
+    def get_etag(self, identifier: str) -> str:
+        """
+        Get entity tag of data source, identifying its content
+
+        :param identifier: `str` of data source identifier
+
+        :returns: `str` of entity tag
+        """
+
+        raise NotImplementedError()
+
+    def get_metadata(self, identifier: str) -> Union[dict, None]:
+        """
+        Get user metadata of data source, without accessing its content
+
+        :param identifier: `str` of data source identifier
+
+        :returns: `dict` of metadata, or `None` if data source does not exist
+        """
+
+        raise NotImplementedError()
+
     def put(self, data: bytes, identifier: str,
-            content_type: str = 'application/octet-stream') -> bool:
+            content_type: str = 'application/octet-stream',
+            metadata: dict = None) -> bool:
         """
         Access data source from storage
 
         :param data: bytes of file to upload
         :param identifier: `str` of data dest identifier
         :param content_type: media type (default is `application/octet-stream`)
+        :param metadata: `dict` of user metadata to store with data
 
         :returns: `bool` of put result
         """
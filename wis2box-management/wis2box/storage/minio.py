@@ -19,10 +19,11 @@
 #
 ###############################################################################
 
-from io import BytesIO
+from datetime import timedelta
+from io import BytesIO, RawIOBase
 import json
 import logging
-from typing import Any
+from typing import Any, Iterator, Union
 from urllib.parse import urlparse
 
 from minio import Minio
@@ -34,6 +35,31 @@ from wis2box.storage.base import PolicyTypes, StorageBase
 LOGGER = logging.getLogger(__name__)
 
 
+class BufferReader(RawIOBase):
+    """File-like reader over a bytes-like object, without copying it"""
+
+    def __init__(self, data: Any) -> None:
+        """
+        Buffer reader initializer
+
+        :param data: bytes-like object
+
+        :returns: `None`
+        """
+
+        self._view = memoryview(data).cast('B')
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        size = min(len(b), len(self._view) - self._position)
+        b[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+
 # default policies
 
 def readonly_policy(name):
@@ -230,24 +256,103 @@ class MinIOStorage(StorageBase):
             LOGGER.error(msg)
         return data
 
+    def get_stream(self, identifier: str,
+                   chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """
+        Access data source from storage in chunks
+
+        :param identifier: `str` of data source identifier
+        :param chunk_size: `int` of chunk size in bytes
+
+        :returns: iterator of `bytes` chunks
+        """
+
+        LOGGER.debug(f'Streaming object {identifier} from bucket={self.name}')
+        response = self.client.get_object(self.name, object_name=identifier)
+        try:
+            yield from response.stream(chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+
+    def get_url(self, identifier: str, expires: int = 3600) -> str:
+        """
+        Get a presigned URL to access data source without credentials
+
+        :param identifier: `str` of data source identifier
+        :param expires: `int` of validity of URL in seconds
+
+        :returns: `str` of URL
+        """
+
+        LOGGER.debug(f'Presigning object {identifier} in bucket={self.name}')
+        return self.client.presigned_get_object(
+            self.name, identifier, expires=timedelta(seconds=expires))
+
+    def get_etag(self, identifier: str) -> str:
+        """
+        Get entity tag of object, identifying its content
+
+        :param identifier: `str` of object identifier
+
+        :returns: `str` of entity tag
+        """
+
+        stat = self.client.stat_object(bucket_name=self.name,
+                                       object_name=identifier)
+        return stat.etag
+
+    def get_metadata(self, identifier: str) -> Union[dict, None]:
+        """
+        Get user metadata of object, without accessing its content
+
+        :param identifier: `str` of object identifier
+
+        :returns: `dict` of metadata, or `None` if object does not exist
+        """
+
+        LOGGER.debug(f'Getting metadata of object {identifier}')
+        try:
+            stat = self.client.stat_object(bucket_name=self.name,
+                                           object_name=identifier)
+        except minio_error.S3Error as err:
+            if err.code == 'NoSuchKey':
+                LOGGER.debug(err)
+                return None
+            else:
+                raise err
+
+        prefix = 'x-amz-meta-'
+        return {key.lower()[len(prefix):]: value
+                for key, value in stat.metadata.items()
+                if key.lower().startswith(prefix)}
+
     def put(self, data: bytes, identifier: str,
-            content_type: str = 'application/octet-stream') -> bool:
+            content_type: str = 'application/octet-stream',
+            metadata: dict = None) -> bool:
         """
         Access data source from storage
 
-        :param data: bytes of file to upload
+        :param data: bytes of file to upload, or bytes-like object
         :param identifier: `str` of data dest identifier
         :param content_type: media type (default is `application/octet-stream`)
+        :param metadata: `dict` of user metadata to store with object
 
         :returns: `bool` of put result
         """
 
         LOGGER.debug(f'Putting data as object={identifier}')
+        if isinstance(data, bytes):
+            data_ = BytesIO(data)
+        else:
+            # shared buffers (e.g. memory-mapped files) are not copied
+            data_ = BufferReader(data)
         try:
             self.client.put_object(bucket_name=self.name,
                                    object_name=identifier,
                                    content_type=content_type,
-                                   data=BytesIO(data), length=-1,
+                                   metadata=metadata,
+                                   data=data_, length=-1,
                                    part_size=10*1024*1024)
         except Exception as err:
             msg = f'Error putting object: {err}'
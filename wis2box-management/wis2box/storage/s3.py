@@ -21,7 +21,7 @@
 
 import logging
 from pathlib import Path
-from typing import Any
+from typing import Any, Union
 
 import boto3
 from botocore.exceptions import ClientError
@@ -65,12 +65,40 @@ class S3Storage(StorageBase):
 
         return data['Body'].read()
 
+    def get_url(self, identifier: str, expires: int = 3600) -> str:
+
+        LOGGER.debug(f'Presigning object {identifier}')
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.name, 'Key': identifier},
+            ExpiresIn=expires)
+
+    def get_etag(self, identifier: str) -> str:
+
+        response = self.client.head_object(Bucket=self.name, Key=identifier)
+        return response['ETag'].strip('"')
+
+    def get_metadata(self, identifier: str) -> Union[dict, None]:
+
+        LOGGER.debug(f'Getting metadata of object {identifier}')
+        try:
+            response = self.client.head_object(Bucket=self.name,
+                                               Key=identifier)
+        except ClientError as e:
+            if e.response['Error']['Code'] == '404':
+                return None
+            else:
+                raise e
+
+        return response['Metadata']
+
     def put(self, filepath: Path, identifier: str,
-            content_type: str = 'application/octet-stream') -> bool:
+            content_type: str = 'application/octet-stream',
+            metadata: dict = None) -> bool:
 
         LOGGER.debug(f'Putting file {filepath} to {identifier}')
         self.client.upload_file(filepath, self.name, identifier,
-                                ContentType=content_type)
+                                ExtraArgs={'ContentType': content_type,
+                                           'Metadata': metadata or {}})
 
         return True
 
@@ -20,6 +20,7 @@
 ###############################################################################
 
 from base64 import b64encode
+from collections import deque
 from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 import isodate
@@ -27,6 +28,7 @@ import logging
 import os
 from pathlib import Path
 import re
+import threading
 from typing import Iterator, Union
 from urllib.parse import urlparse
 import yaml
@@ -239,3 +241,95 @@ def remove_auth_from_url(url: str, replace_with: str = None) -> str:
         return url.replace(auth, f'{replace_with}@')
     else:
         return url.replace(auth, '')
+
+
+def fork_safe_lock() -> threading.Lock:
+    """
+    Create a lock that is released in processes forked while it is held
+
+    A child process only runs the thread that forked it, so a lock held
+    by any other thread of the parent would never be released in the
+    child.
+
+    :returns: `threading.Lock` object
+    """
+
+    lock = threading.Lock()
+
+    def release() -> None:
+        if lock.locked():
+            lock.release()
+
+    os.register_at_fork(after_in_child=release)
+
+    return lock
+
+
+class SubstringIndex:
+    """
+    Aho-Corasick automaton finding which of a set of strings occur in a
+    text, in time proportional to the length of the text
+    """
+
+    def __init__(self, patterns: list) -> None:
+        """
+        Substring index initializer
+
+        :param patterns: `list` of strings to search for
+
+        :returns: `None`
+        """
+
+        self.patterns = list(dict.fromkeys(pattern for pattern in patterns
+                                           if pattern))
+        # position of each pattern, to rank patterns found
+        self.order = {pattern: i for i, pattern in enumerate(self.patterns)}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+
+        for pattern in self.patterns:
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state] = (pattern,)
+
+        # breadth-first, so that failure states are complete when used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                self._output[next_state] += self._output[fail]
+
+    def search(self, text: str) -> set:
+        """
+        Find patterns contained in a text
+
+        :param text: `str` of text to search
+
+        :returns: `set` of patterns found
+        """
+
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            found.update(self._output[state])
+
+        return found
+
+    def __repr__(self):
+        return f'<SubstringIndex ({len(self.patterns)} patterns)>'
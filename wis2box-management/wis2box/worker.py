@@ -0,0 +1,432 @@
+###############################################################################
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+###############################################################################
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import multiprocessing as mp
+import os
+import resource
+import signal
+import threading
+from typing import Any, Callable
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_memory_usage() -> int:
+    """
+    Get the peak resident memory of the current process
+
+    :returns: `int` of peak resident memory in MB
+    """
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+def _work(slot: int, conn: Any, results: Any, target: Callable[..., Any],
+          initializer: Callable[..., Any] = None,
+          max_tasks: int = 0, max_memory: int = 0) -> None:
+    """
+    Worker process main loop
+
+    :param slot: `int` of worker slot in the pool
+    :param conn: `multiprocessing.Connection` to receive tasks from
+    :param results: `multiprocessing.Queue` to report task results to
+    :param target: Python callable run for every task
+    :param initializer: Python callable run once at worker start
+    :param max_tasks: number of tasks after which the worker is recycled
+    :param max_memory: memory growth (MB) after which the worker is recycled
+
+    :returns: `None`
+    """
+
+    # signal handlers of the parent process do not apply to workers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    if initializer is not None:
+        initializer()
+
+    baseline = get_memory_usage()
+    ntasks = 0
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        task_id, args = task
+        retire = False
+        try:
+            target(*args)
+            success = True
+        except Exception as err:
+            LOGGER.error(f'Task {task_id} failed: {err}')
+            success = False
+        except BaseException as err:
+            # e.g. SystemExit: report back before exiting
+            LOGGER.error(f'Task {task_id} failed: {err!r}, exiting')
+            success = False
+            retire = True
+        ntasks += 1
+
+        if max_tasks > 0 and ntasks >= max_tasks:
+            LOGGER.debug(f'Worker {slot} reached {ntasks} tasks, recycling')
+            retire = True
+        growth = get_memory_usage() - baseline
+        if max_memory > 0 and growth >= max_memory:
+            LOGGER.debug(f'Worker {slot} grew by {growth} MB, recycling')
+            retire = True
+
+        results.put((slot, task_id, success, retire))
+        if retire:
+            break
+
+
+class WorkerPool:
+    """Pool of pre-forked, long-lived worker processes"""
+
+    def __init__(self, target: Callable[..., Any], size: int = None,
+                 max_tasks: int = 0, max_memory: int = 0,
+                 initializer: Callable[..., Any] = None,
+                 callback: Callable[..., Any] = None) -> None:
+        """
+        Worker pool initializer
+
+        :param target: Python callable run by the workers for every task
+        :param size: number of worker processes (default is number of CPUs)
+        :param max_tasks: number of tasks after which a worker is recycled
+                          (0 disables)
+        :param max_memory: memory growth (MB) after which a worker is
+                           recycled (0 disables)
+        :param initializer: Python callable run once at worker start
+        :param callback: Python callable called with `task_id`, `args` and
+                         `success` once a task is done
+
+        :returns: `None`
+        """
+
+        self.target = target
+        self.size = size or os.cpu_count()
+        self.max_tasks = max_tasks
+        self.max_memory = max_memory
+        self.initializer = initializer
+        self.callback = callback
+
+        self._ctx = mp.get_context('fork')
+        self._results = self._ctx.Queue()
+        self._workers = {}
+        self._idle = []
+        self._cond = threading.Condition()
+        self._running = False
+        self._collector = None
+        self._next_task_id = 0
+
+    def _spawn(self, slot: int) -> None:
+        """
+        Fork a worker process into a pool slot
+
+        :param slot: `int` of worker slot
+
+        :returns: `None`
+        """
+
+        conn_recv, conn_send = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_work, daemon=True,
+            args=(slot, conn_recv, self._results, self.target,
+                  self.initializer, self.max_tasks, self.max_memory))
+        process.start()
+        conn_recv.close()
+
+        LOGGER.debug(f'Started worker {slot} (pid={process.pid})')
+        self._workers[slot] = {
+            'process': process,
+            'conn': conn_send,
+            'task': None,
+            # whether the worker reported that it is exiting
+            'retiring': False
+        }
+        self._idle.append(slot)
+
+    def _finish(self, slot: int, task_id: int, success: bool) -> None:
+        """
+        Mark the current task of a worker slot as done
+
+        :param slot: `int` of worker slot
+        :param task_id: `int` of task identifier
+        :param success: `bool` of task result
+
+        :returns: `None`
+        """
+
+        worker = self._workers[slot]
+        task = worker['task']
+        worker['task'] = None
+        if task is None or task[0] != task_id:
+            return
+        if self.callback is not None:
+            try:
+                self.callback(task_id, task[1], success)
+            except Exception as err:
+                LOGGER.error(f'Task callback failed: {err}')
+
+    def _report(self, slot: int, task_id: int, success: bool,
+                retire: bool) -> None:
+        """
+        Handle the report of a worker on its task
+
+        :param slot: `int` of worker slot
+        :param task_id: `int` of task identifier
+        :param success: `bool` of task result
+        :param retire: `bool` of whether the worker is exiting
+
+        :returns: `None`
+        """
+
+        self._finish(slot, task_id, success)
+        if retire:
+            self._workers[slot]['retiring'] = True
+        else:
+            self._idle.append(slot)
+
+    def _collect(self) -> None:
+        """
+        Collect task results and replace exited workers
+
+        :returns: `None`
+        """
+
+        while self._running:
+            try:
+                report = self._results.get(timeout=0.5)
+            except Exception:
+                report = None
+
+            with self._cond:
+                if report is not None:
+                    self._report(*report)
+
+                exited = [slot for slot, worker in self._workers.items()
+                          if worker['process'].exitcode is not None]
+                if exited:
+                    # reports are sent before exiting, so that any report
+                    # of an exited worker is already queued
+                    while True:
+                        try:
+                            self._report(*self._results.get_nowait())
+                        except Exception:
+                            break
+
+                for slot in exited:
+                    worker = self._workers[slot]
+                    if slot in self._idle:
+                        self._idle.remove(slot)
+                    task = worker['task']
+                    exitcode = worker['process'].exitcode
+                    if not worker['retiring']:
+                        msg = f'Worker {slot} exited unexpectedly (exitcode={exitcode})' # noqa
+                        if task is not None:
+                            msg += f' while handling {task[1]}'
+                        LOGGER.error(msg)
+                        if task is not None:
+                            self._finish(slot, task[0], False)
+                    worker['process'].join()
+                    self._spawn(slot)
+
+                self._cond.notify_all()
+
+    def start(self) -> None:
+        """
+        Start worker processes
+
+        :returns: `None`
+        """
+
+        LOGGER.info(f'Starting {self.size} workers')
+        with self._cond:
+            for slot in range(self.size):
+                self._spawn(slot)
+        self._running = True
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def submit(self, *args) -> int:
+        """
+        Submit a task to the next idle worker, blocking while all
+        workers are busy
+
+        :param args: arguments passed to the target
+
+        :returns: `int` of task identifier
+        """
+
+        with self._cond:
+            task_id = self._next_task_id
+            self._next_task_id += 1
+            while True:
+                while not self._idle:
+                    self._cond.wait()
+                slot = self._idle.pop(0)
+                worker = self._workers[slot]
+                worker['task'] = (task_id, args)
+                try:
+                    worker['conn'].send((task_id, args))
+                    break
+                except (BrokenPipeError, OSError) as err:
+                    # the worker died before the collector noticed, so
+                    # replace it and try the next idle worker
+                    LOGGER.error(f'Worker {slot} unavailable: {err}')
+                    worker['task'] = None
+                    worker['process'].terminate()
+                    worker['process'].join()
+                    self._spawn(slot)
+                except Exception:
+                    # the task could not be sent (e.g. not picklable)
+                    worker['task'] = None
+                    self._idle.insert(0, slot)
+                    raise
+
+        return task_id
+
+    def stop(self, timeout: float = 30) -> None:
+        """
+        Stop worker processes once their current task is done
+
+        :param timeout: `float` of seconds to wait for each worker
+
+        :returns: `None`
+        """
+
+        self._running = False
+        for worker in self._workers.values():
+            try:
+                worker['conn'].send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers.values():
+            worker['process'].join(timeout)
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+
+    def __repr__(self):
+        return f'<WorkerPool ({self.size})>'
+
+
+class ThreadWorkerPool:
+    """
+    Pool of threads within a single process, for I/O-bound workloads
+
+    Targets must be thread safe, and clients cached per process are
+    shared by all tasks.
+    """
+
+    def __init__(self, target: Callable[..., Any], size: int = 100,
+                 callback: Callable[..., Any] = None) -> None:
+        """
+        Thread worker pool initializer
+
+        :param target: Python callable run for every task
+        :param size: maximum number of tasks in flight
+        :param callback: Python callable called with `task_id`, `args` and
+                         `success` once a task is done
+
+        :returns: `None`
+        """
+
+        self.target = target
+        self.size = size
+        self.callback = callback
+
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._next_task_id = 0
+
+    def _run(self, task_id: int, args: tuple) -> None:
+        """
+        Run a task
+
+        :param task_id: `int` of task identifier
+        :param args: `tuple` of arguments passed to the target
+
+        :returns: `None`
+        """
+
+        try:
+            self.target(*args)
+            success = True
+        except Exception as err:
+            LOGGER.error(f'Task {task_id} failed: {err}')
+            success = False
+        finally:
+            self._slots.release()
+
+        if self.callback is not None:
+            try:
+                self.callback(task_id, args, success)
+            except Exception as err:
+                LOGGER.error(f'Task callback failed: {err}')
+
+    def start(self) -> None:
+        """
+        Start the threads
+
+        :returns: `None`
+        """
+
+        LOGGER.info(f'Starting {self.size} worker threads')
+        self._executor = ThreadPoolExecutor(max_workers=self.size)
+
+    def submit(self, *args) -> int:
+        """
+        Submit a task, blocking while the pool is full
+
+        :param args: arguments passed to the target
+
+        :returns: `int` of task identifier
+        """
+
+        self._slots.acquire()
+        with self._lock:
+            task_id = self._next_task_id
+            self._next_task_id += 1
+        try:
+            self._executor.submit(self._run, task_id, args)
+        except Exception:
+            self._slots.release()
+            raise
+
+        return task_id
+
+    def stop(self) -> None:
+        """
+        Stop the threads once tasks in flight are done
+
+        :returns: `None`
+        """
+
+        self._executor.shutdown(wait=True)
+
+    def __repr__(self):
+        return f'<ThreadWorkerPool ({self.size})>'
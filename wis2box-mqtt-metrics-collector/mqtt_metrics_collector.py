@@ -76,6 +76,8 @@ storage_incoming_total = Counter('wis2box_storage_incoming_total',
                                  'Total storage notifications received on incoming') # noqa
 storage_public_total = Counter('wis2box_storage_public_total',
                                'Total storage notifications received on public') # noqa
+storage_duplicate_total = Counter('wis2box_storage_duplicate_total',
+                                  'Total duplicate storage notifications suppressed by the subscriber') # noqa
 
 broker_msg_sent = Gauge('wis2box_broker_msg_sent',
                         '$SYS/messages/sent')
@@ -216,6 +218,8 @@ class MetricsCollector:
                     notify_wsi_total.labels(wsi).inc(0)
                     failure_wsi_total.labels(wsi).inc(1)
                     failure_total.inc(1)
+                elif topic.startswith('wis2box/storage/duplicate'):
+                    storage_duplicate_total.inc(1)
                 elif topic.startswith('wis2box/storage'):
                     if str(m["Key"]).startswith('wis2box-incoming'):
                         storage_incoming_total.inc(1)